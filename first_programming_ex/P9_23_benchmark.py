@@ -0,0 +1,119 @@
+import argparse, random, timeit, tracemalloc
+from P9_23_module import CountryCollection
+
+
+## Benchmarks for the CountryCollection class
+#  Run with e.g. "python P9_23_benchmark.py --sizes 1000 10000 100000" from this folder.
+#
+
+
+## Builds a collection of random countries in both the list and the dictionary
+#  @param size the number of countries
+#  @param seed the seed of the random number generator
+#  @return the filled CountryCollection
+#
+def random_collection(size, seed=0):
+    rng = random.Random(seed)
+    collection = CountryCollection()
+    for i in range(size):
+        population = rng.randint(1, 10**9)
+        area = rng.uniform(1, 10**7)
+        collection.addCountryToList(f"C{i}", population, area)
+        collection.addCountryToDict(f"C{i}", population, area)
+    return collection
+
+
+## Measures the number of calls per second of a function
+#  @param func the function to call
+#  @param seconds the approximate time to spend measuring
+#  @return the calls per second
+#
+def calls_per_second(func, seconds=0.2):
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * seconds / max(elapsed, 1e-9)))
+    return number / timer.timeit(number)
+
+
+## Compares the indexed largest-queries with a full max() scan for growing collection sizes
+#  @param sizes the collection sizes to benchmark
+#
+def bench_largest(sizes):
+    print(f"{'size':>10} {'indexed q/s':>14} {'scan q/s':>14} {'top-10 q/s':>14}")
+    for size in sizes:
+        collection = random_collection(size)
+        countries = list(collection._country_list)
+        indexed = calls_per_second(collection.list_largest_population)
+        scan = calls_per_second(lambda: max(countries, key=lambda i: i.population).name)
+        top10 = calls_per_second(lambda: collection.list_top("population", 10))
+        print(f"{size:>10} {indexed:>14.0f} {scan:>14.0f} {top10:>14.0f}")
+
+
+## Compares the indexed range and percentile queries with a linear scan for growing collection sizes
+#  The sorted index is built by the first query, so the reported rates are for repeated queries.
+#  @param sizes the collection sizes to benchmark
+#
+def bench_range(sizes):
+    print(f"{'size':>10} {'range q/s':>14} {'scan q/s':>14} {'median q/s':>14}")
+    for size in sizes:
+        collection = random_collection(size)
+        countries = list(collection._country_list)
+        low, high = 10**8, 10**8 + 10**6
+        indexed = calls_per_second(lambda: collection.list_between("population", low, high))
+        scan = calls_per_second(lambda: [c.name for c in countries if low <= c.population <= high])
+        median = calls_per_second(lambda: collection.list_percentile("population", 50))
+        print(f"{size:>10} {indexed:>14.0f} {scan:>14.0f} {median:>14.0f}")
+
+
+## Measures the memory per country of a collection holding the same countries in both the list and the dictionary
+#  The baseline is the same data stored as a list of Country objects with a __dict__ and a dictionary
+#  of per-country dictionaries, which is how CountryCollection stored them before the shared record store.
+#  CountryCollection is measured with its sorted indexes, which the baseline does not have.
+#  @param sizes the collection sizes to benchmark
+#
+def bench_memory(sizes):
+    ## A Country with a per-instance __dict__ like the original class
+    class DictCountry:
+        def __init__(self, name, population, area):
+            self._name = name
+            self._population = population
+            self._area = area
+
+    ## Measures the memory allocated by a function while keeping its result alive
+    def allocated(func):
+        tracemalloc.start()
+        result = func()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del result
+        return size
+
+    ## Fills a collection with the same countries in the list and the dictionary
+    def fill(collection):
+        collection.addCountriesToList(names, populations, areas)
+        collection.addCountriesToDict(names, populations, areas)
+        return collection
+
+    print(f"{'size':>10} {'baseline B/country':>19} {'CountryCollection B/country':>28}")
+    for size in sizes:
+        rng = random.Random(0)
+        names = [f"C{i}" for i in range(size)]
+        populations = [rng.randint(1, 10**9) for _ in range(size)]
+        areas = [rng.uniform(1, 10**7) for _ in range(size)]
+
+        baseline = allocated(lambda: (list(map(DictCountry, names, populations, areas)),
+                                      {name: {"population": population, "area": area}
+                                       for name, population, area in zip(names, populations, areas)}))
+        collection = allocated(lambda: fill(CountryCollection()))
+        print(f"{size:>10} {baseline / size:>19.0f} {collection / size:>28.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='P9_23_benchmark',
+                                     description="Benchmarks for the CountryCollection class.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="The collection sizes to benchmark.")
+    args = parser.parse_args()
+
+    bench_largest(args.sizes)
+    bench_range(args.sizes)
+    bench_memory(args.sizes)
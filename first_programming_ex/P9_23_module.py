@@ -2,20 +2,27 @@
 ## A module defining two classes, a class for a single country and a class to handle multiple countries
 #
 # 
+import array, bisect, csv, itertools, math
+from collections.abc import Mapping, Sequence
 
-## A Country class with a name, population and area
+
+## A Country class with a name, population, area and an optional group such as a continent or region
+#  The attributes are declared in __slots__, so a Country has no per-instance dictionary.
 #
 class Country:
+    __slots__ = ("_name", "_population", "_area", "_group")
 
     ## Constructs a Country 
     #  @param name the name of the country
     #  @param population the population of the country
     #  @param area the area of the country
+    #  @param group the group the country belongs to, or None
     #
-    def __init__(self, name, population, area):
+    def __init__(self, name, population, area, group=None):
         self._name = name
         self._population = population
         self._area = area
+        self._group = group
 
     ## Gets the name of the country
     #  @return name of the country
@@ -45,124 +52,930 @@ class Country:
     def popDensity(self):
         return self._population / self._area
 
+    ## Gets the group of the country
+    #  @return the group of the country or None
+    #
+    @property
+    def group(self):
+        return self._group
+
+
+## Computes the population density used by the indexes and rollups of CountryCollection
+#  A country without area has an infinite density with the sign of its population, or a density of
+#  0 if it has no population either, so it can be added and ranked instead of failing the insert.
+#  NaN is never returned, as it cannot be ordered in the sorted indexes.
+#  @param population the population
+#  @param area the area
+#  @return the population density
+#
+def _density(population, area):
+    if area == 0:
+        return math.copysign(math.inf, population) if population else 0.0
+    return population / area
+
+
+## A sorted index over one metric used by CountryCollection to answer largest, top-k, bottom-k, range and percentile queries.
+#  The (key, id) entries are kept sorted by key in buckets of at most 2 * _LOAD entries. The keys of
+#  a bucket are a list, or an array of doubles for a metric of computed floats, and the ids are an
+#  array of 64-bit ints, so an entry takes 16 bytes. An insert or removal only shifts the entries of
+#  one bucket, and the largest and smallest keys are at the ends of the last and first bucket.
+#  Entries with equal keys are returned in the order given by order_of(id), the lowest order first
+#  like the first item in max().
+#
+class _SortedIndex:
+    _LOAD = 1000
+
+    ## Constructs an empty index
+    #  @param order_of a function from an id to its tie-break order
+    #  @param floats True to store the keys as doubles instead of references to key objects
+    #
+    def __init__(self, order_of, floats=False):
+        self._order_of = order_of
+        self._floats = floats
+        self._keys = []
+        self._ids = []
+        # The last key of every bucket, to find the bucket of a key with binary search
+        self._maxes = []
+        self._len = 0
+
+    ## Gets the number of entries in the index
+    #  @return the number of entries
+    #
+    def __len__(self):
+        return self._len
+
+    ## Creates a bucket of keys
+    #  @param keys an iterable of keys
+    #  @return the bucket
+    #
+    def _bucket(self, keys):
+        return array.array("d", keys) if self._floats else list(keys)
+
+    ## Inserts an entry
+    #  @param key the value of the metric
+    #  @param ident the id of the entry
+    #
+    def add(self, key, ident):
+        if self._floats:
+            key = float(key)
+        self._len += 1
+        if not self._maxes:
+            self._keys.append(self._bucket([key]))
+            self._ids.append(array.array("q", [ident]))
+            self._maxes.append(key)
+            return
+
+        bucket = bisect.bisect_right(self._maxes, key)
+        if bucket == len(self._maxes):
+            bucket -= 1
+            self._keys[bucket].append(key)
+            self._ids[bucket].append(ident)
+            self._maxes[bucket] = key
+        else:
+            position = bisect.bisect_right(self._keys[bucket], key)
+            self._keys[bucket].insert(position, key)
+            self._ids[bucket].insert(position, ident)
+
+        if len(self._ids[bucket]) > 2 * self._LOAD:
+            keys, ids = self._keys[bucket], self._ids[bucket]
+            self._keys.insert(bucket + 1, keys[self._LOAD:])
+            self._ids.insert(bucket + 1, ids[self._LOAD:])
+            del keys[self._LOAD:]
+            del ids[self._LOAD:]
+            self._maxes.insert(bucket, keys[-1])
+
+    ## Inserts many entries at once
+    #  Unless there are few new entries, the index is rebuilt with one sort, which finds the
+    #  entries already in the index as one sorted run and only sorts the new entries.
+    #  @param keys an iterable of keys
+    #  @param ids a sequence of ids in the same order
+    #
+    def add_many(self, keys, ids):
+        keys = list(map(float, keys)) if self._floats else list(keys)
+        if len(keys) * 8 < self._len:
+            for key, ident in zip(keys, ids):
+                self.add(key, ident)
+            return
+
+        all_keys = list(itertools.chain(*self._keys, keys))
+        all_ids = array.array("q", itertools.chain(*self._ids, ids))
+        permutation = sorted(range(len(all_keys)), key=all_keys.__getitem__)
+        self._keys, self._ids = [], []
+        for start in range(0, len(permutation), self._LOAD):
+            chunk = permutation[start:start + self._LOAD]
+            self._keys.append(self._bucket(map(all_keys.__getitem__, chunk)))
+            self._ids.append(array.array("q", map(all_ids.__getitem__, chunk)))
+        self._maxes = [keys[-1] for keys in self._keys]
+        self._len = len(permutation)
+
+    ## Removes an entry, an entry that is not in the index is ignored
+    #  @param key the value of the metric the entry was inserted with
+    #  @param ident the id of the entry
+    #
+    def remove(self, key, ident):
+        if self._floats:
+            key = float(key)
+        # The entries with the key can span several buckets, starting at the first bucket that can hold the key
+        bucket = bisect.bisect_left(self._maxes, key)
+        while bucket < len(self._maxes):
+            keys, ids = self._keys[bucket], self._ids[bucket]
+            start = bisect.bisect_left(keys, key)
+            stop = bisect.bisect_right(keys, key)
+            try:
+                position = ids.index(ident, start, stop)
+            except ValueError:
+                if stop < len(keys):
+                    return
+                bucket += 1
+                continue
+            del keys[position]
+            del ids[position]
+            self._len -= 1
+            if ids:
+                self._maxes[bucket] = keys[-1]
+            else:
+                del self._keys[bucket], self._ids[bucket], self._maxes[bucket]
+            return
+
+    ## Iterates over the (key, id) entries from a position in a bucket, in ascending order of the key
+    #  @param bucket the bucket to start in
+    #  @param position the position in the bucket to start at
+    #  @return a generator of (key, id) tuples
+    #
+    def _ascending(self, bucket=0, position=0):
+        for bucket in range(bucket, len(self._ids)):
+            yield from itertools.islice(zip(self._keys[bucket], self._ids[bucket]), position, None)
+            position = 0
+
+    ## Iterates over the (key, id) entries in descending order of the key
+    #  @return a generator of (key, id) tuples
+    #
+    def _descending(self):
+        for bucket in reversed(range(len(self._ids))):
+            yield from zip(reversed(self._keys[bucket]), reversed(self._ids[bucket]))
+
+    ## Takes the first k entries and the entries after them with the same key as the k-th entry
+    #  @param entries an iterator of (key, id) tuples
+    #  @param k the number of entries
+    #  @return a list of (key, id) tuples
+    #
+    @staticmethod
+    def _first(entries, k):
+        taken = []
+        for entry in entries:
+            if len(taken) >= k and entry[0] != taken[-1][0]:
+                break
+            taken.append(entry)
+        return taken
+
+    ## Orders entries by key and entries with equal keys by their tie-break order
+    #  @param entries a list of (key, id) tuples
+    #  @param descending True to order the keys from the largest
+    #  @return the list of ids
+    #
+    def _ordered(self, entries, descending=False):
+        order_of = self._order_of
+        entries.sort(key=lambda entry: order_of(entry[1]))
+        # The sort is stable, so entries with equal keys stay in their tie-break order
+        entries.sort(key=lambda entry: entry[0], reverse=descending)
+        return [entry[1] for entry in entries]
+
+    ## Gets the id of the entry with the largest key
+    #  @return the id or None if the index is empty
+    #
+    def max(self):
+        if not self._ids:
+            return None
+        keys = self._keys[-1]
+        # Without a tie the largest entry is the last one, otherwise the tie-break order decides
+        if len(keys) > 1 and keys[-2] != keys[-1]:
+            return self._ids[-1][-1]
+        largest = self.top(1)
+        return largest[0] if largest else None
+
+    ## Gets the ids of the k entries with the largest keys, largest first
+    #  @param k the number of entries to return
+    #  @return a list of at most k ids
+    #
+    def top(self, k):
+        if k <= 0:
+            return []
+        return self._ordered(self._first(self._descending(), k), True)[:k]
+
+    ## Gets the ids of the k entries with the smallest keys, smallest first
+    #  @param k the number of entries to return
+    #  @return a list of at most k ids
+    #
+    def bottom(self, k):
+        if k <= 0:
+            return []
+        return self._ordered(self._first(self._ascending(), k))[:k]
+
+    ## Gets the ids of the entries with a key between low and high, both included
+    #  @param low the lower bound
+    #  @param high the upper bound
+    #  @return a list of ids in ascending order of the key
+    #
+    def between(self, low, high):
+        bucket = bisect.bisect_left(self._maxes, low)
+        if bucket == len(self._maxes):
+            return []
+        position = bisect.bisect_left(self._keys[bucket], low)
+        entries = itertools.takewhile(lambda entry: entry[0] <= high, self._ascending(bucket, position))
+        return self._ordered(list(entries))
+
+    ## Gets the key at a position in ascending order
+    #  @param position the position
+    #  @return the key
+    #
+    def _key_at(self, position):
+        for keys in self._keys:
+            if position < len(keys):
+                return keys[position]
+            position -= len(keys)
+
+    ## Gets the p-th percentile of the keys, interpolating linearly between the two closest keys
+    #  @param p the percentile between 0 and 100
+    #  @return the percentile
+    #
+    def percentile(self, p):
+        position = (self._len - 1) * p / 100
+        lower = int(position)
+        lower_key = self._key_at(lower)
+        upper_key = self._key_at(min(lower + 1, self._len - 1))
+        # Equal keys are returned as they are, which also keeps two infinite keys from giving NaN
+        if lower_key == upper_key:
+            return lower_key
+        return lower_key + (upper_key - lower_key) * (position - lower)
+
+
+## The running totals and largest members of one group of countries in a CountryCollection
+#  The totals are updated on every add and remove, so a rollup of a group never scans its members.
+#
+class _GroupStats:
+
+    ## Constructs an empty group
+    #  @param largest a dictionary from metric to an empty _SortedIndex of the members of the group
+    #
+    def __init__(self, largest):
+        self.countries = 0
+        self.population = 0
+        self.area = 0
+        self.largest = largest
+
+
+## A read-only list view of the countries in the country list of a CountryCollection
+#  The view reads the record store of the collection and creates a Country object for every
+#  country it returns, so the collection does not hold one object per country.
+#
+class _CountryListView(Sequence):
+
+    ## Constructs the view
+    #  @param collection the CountryCollection to view
+    #
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __len__(self):
+        return len(self._collection._list_records)
+
+    def __getitem__(self, position):
+        collection = self._collection
+        if isinstance(position, slice):
+            return [collection._country(i) for i in collection._list_records[position]]
+        return collection._country(collection._list_records[position])
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+## A read-only view of one country in the country dictionary as a {"population": ..., "area": ...} mapping
+#
+class _CountryFields(Mapping):
+    __slots__ = ("_country",)
+    _KEYS = ("population", "area")
+
+    ## Constructs the view
+    #  @param country the Country record to view
+    #
+    def __init__(self, country):
+        self._country = country
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __getitem__(self, key):
+        if key == "population":
+            return self._country.population
+        if key == "area":
+            return self._country.area
+        raise KeyError(key)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+## A read-only dictionary view of the country dictionary of a CountryCollection, mapping names to country fields
+#
+class _CountryDictView(Mapping):
+
+    ## Constructs the view
+    #  @param collection the CountryCollection to view
+    #
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __len__(self):
+        return len(self._collection._dict_records)
+
+    def __iter__(self):
+        return iter(self._collection._dict_records)
+
+    def __getitem__(self, name):
+        return _CountryFields(self._collection._country(self._collection._dict_records[name]))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
 
 ## A CountryCollection class that maintains a list and a dictionary of countries.
 #  It allows adding countries to both the list and the dictionary and provides methods
-#  to retrieve the country with the largest area, population, or population density from both.
+#  to retrieve the country with the largest area, population or population density from both.
+#  A sorted index per metric is updated on every add and remove, so the largest, top-k, bottom-k,
+#  range and percentile queries do not have to scan the whole collection.
+#
+#  Both the list and the dictionary are stored as record ids into one record store, which keeps
+#  the name, population, area and group of every record in four columns, and a country added to
+#  both with the same values is stored only once. The ids of records that are no longer in the
+#  list or the dictionary are kept in a free list and reused by the next new records.
 #
 class CountryCollection:
 
-    ## Constructs a CountryCollection 
-    #  Initializes an empty list and an empty dictionary for storing countries.
+    ## The metrics that can be queried, mapped to the function computing them from population and area
+    _METRICS = {
+        "area": lambda population, area: area,
+        "population": lambda population, area: population,
+        "density": _density,
+    }
+    ## The metrics computed as a new float for every country, whose keys are stored as doubles in the indexes
+    _FLOAT_METRICS = ("density",)
+
+    ## Constructs a CountryCollection
+    #  Initializes an empty record store, an empty list and an empty dictionary for storing
+    #  countries, together with an index for every metric on both of them.
     #
     def __init__(self):
-        self._country_list = []
-        self._country_dict = {}
+        self._names = []
+        self._populations = []
+        self._areas = []
+        self._groups = []
+        self._free = array.array("q")
+        self._name_index = {}
+        self._in_list = bytearray()
+        self._list_records = array.array("q")
+        # The tie-break orders of the list and the dictionary, by record id
+        self._list_orders = array.array("q")
+        self._dict_orders = array.array("q")
+        self._list_order = itertools.count()
+        self._dict_records = {}
+        self._dict_order = itertools.count()
+        self._list_index = self._indexes(self._list_orders)
+        self._dict_index = self._indexes(self._dict_orders)
+        self._list_groups = {}
+        self._dict_groups = {}
+
+    ## Creates an empty sorted index for every metric
+    #  @param orders the tie-break orders of the list or the dictionary
+    #  @return a dictionary from metric to _SortedIndex
+    #
+    def _indexes(self, orders):
+        return {metric: _SortedIndex(orders.__getitem__, metric in self._FLOAT_METRICS) for metric in self._METRICS}
+
+    ## Gets the country list as a read-only list of Country objects
+    #  @return a view of the country list
+    #
+    @property
+    def _country_list(self):
+        return _CountryListView(self)
+
+    ## Gets the country dictionary as a read-only mapping from names to {"population", "area"} mappings
+    #  @return a view of the country dictionary
+    #
+    @property
+    def _country_dict(self):
+        return _CountryDictView(self)
+
+    ## Creates a Country object from a record
+    #  @param record_id the id of the record
+    #  @return the Country
+    #
+    def _country(self, record_id):
+        return Country(self._names[record_id], self._populations[record_id],
+                       self._areas[record_id], self._groups[record_id])
+
+    ## Finds the record of a country, or creates it if no record with the same values exists
+    #  @param name the name of the country
+    #  @param population the population of the country
+    #  @param area the area of the country
+    #  @param group the group of the country
+    #  @param for_list True if the record will be added to the list, which holds every record at most once
+    #  @return the id of the record
+    #
+    def _record(self, name, population, area, group, for_list):
+        record_id = self._name_index.get(name)
+        if record_id is not None:
+            if (self._populations[record_id] == population and self._areas[record_id] == area
+                    and self._groups[record_id] == group and not (for_list and self._in_list[record_id])):
+                return record_id
+
+        if self._free:
+            record_id = self._free.pop()
+            self._names[record_id] = name
+            self._populations[record_id] = population
+            self._areas[record_id] = area
+            self._groups[record_id] = group
+        else:
+            record_id = len(self._names)
+            self._names.append(name)
+            self._populations.append(population)
+            self._areas.append(area)
+            self._groups.append(group)
+            self._in_list.append(0)
+            self._list_orders.append(0)
+            self._dict_orders.append(0)
+        self._name_index[name] = record_id
+        return record_id
+
+    ## Frees a record when it is neither in the list nor in the dictionary
+    #  @param record_id the id of the record
+    #
+    def _release(self, record_id):
+        name = self._names[record_id]
+        if self._in_list[record_id] or self._dict_records.get(name) == record_id:
+            return
+        if self._name_index.get(name) == record_id:
+            del self._name_index[name]
+        self._names[record_id] = self._populations[record_id] = self._areas[record_id] = self._groups[record_id] = None
+        self._free.append(record_id)
+
+    ## Adds a record to the indexes of every metric
+    #  @param indexes the indexes of the list, the dictionary or a group
+    #  @param record_id the id of the record
+    #
+    def _index_add(self, indexes, record_id):
+        population, area = self._populations[record_id], self._areas[record_id]
+        for metric, compute in self._METRICS.items():
+            indexes[metric].add(compute(population, area), record_id)
+
+    ## Removes a record from the indexes of every metric
+    #  @param indexes the indexes of the list, the dictionary or a group
+    #  @param record_id the id of the record
+    #
+    def _index_remove(self, indexes, record_id):
+        population, area = self._populations[record_id], self._areas[record_id]
+        for metric, compute in self._METRICS.items():
+            indexes[metric].remove(compute(population, area), record_id)
+
+    ## Adds a country to the running totals of its group
+    #  @param groups the groups of the list or the dictionary
+    #  @param orders the tie-break orders of the list or the dictionary
+    #  @param record_id the id of the record of the country
+    #
+    def _group_add(self, groups, orders, record_id):
+        group = self._groups[record_id]
+        if group is None:
+            return
+        if group not in groups:
+            groups[group] = _GroupStats(self._indexes(orders))
+        stats = groups[group]
+        stats.countries += 1
+        stats.population += self._populations[record_id]
+        stats.area += self._areas[record_id]
+        self._index_add(stats.largest, record_id)
+
+    ## Removes a country from the running totals of its group
+    #  @param groups the groups of the list or the dictionary
+    #  @param record_id the id of the record of the country
+    #
+    def _group_remove(self, groups, record_id):
+        group = self._groups[record_id]
+        if group is None:
+            return
+        stats = groups[group]
+        stats.countries -= 1
+        if not stats.countries:
+            del groups[group]
+            return
+        stats.population -= self._populations[record_id]
+        stats.area -= self._areas[record_id]
+        self._index_remove(stats.largest, record_id)
 
     ## Adds a new Country object to the country list
     #  @param name the name of the country
     #  @param population the population of the country
     #  @param area the area of the country
+    #  @param group the group of the country, e.g. its continent, or None
     #
-    def addCountryToList(self, name, population, area):
-        new_country = Country(name, population, area)  
-        self._country_list.append(new_country)
+    def addCountryToList(self, name, population, area, group=None):
+        record_id = self._record(name, population, area, group, True)
+        self._in_list[record_id] = 1
+        self._list_records.append(record_id)
+        self._list_orders[record_id] = next(self._list_order)
+        self._index_add(self._list_index, record_id)
+        self._group_add(self._list_groups, self._list_orders, record_id)
 
-    ## Adds a new country to the country dictionary
+    ## Replaces the record of a name in the country dictionary and updates the group totals
+    #  The new record is not added to the metric indexes of the dictionary.
     #  @param name the name of the country
     #  @param population the population of the country
     #  @param area the area of the country
+    #  @param group the group of the country
+    #  @return the id of the new record
+    #
+    def _set_dict_record(self, name, population, area, group):
+        old_record_id = self._dict_records.get(name)
+        if old_record_id is None:
+            order = next(self._dict_order)
+        else:
+            # A replaced country keeps its position in the dictionary, and therefore also its tie-break order
+            order = self._dict_orders[old_record_id]
+            self._index_remove(self._dict_index, old_record_id)
+            self._group_remove(self._dict_groups, old_record_id)
+        record_id = self._record(name, population, area, group, False)
+        self._dict_records[name] = record_id
+        self._dict_orders[record_id] = order
+        if old_record_id is not None and old_record_id != record_id:
+            self._release(old_record_id)
+        self._group_add(self._dict_groups, self._dict_orders, record_id)
+        return record_id
+
+    ## Adds a new country to the country dictionary, replacing the country if the name already exists
+    #  @param name the name of the country
+    #  @param population the population of the country
+    #  @param area the area of the country
+    #  @param group the group of the country, e.g. its continent, or None
+    #
+    def addCountryToDict(self, name, population, area, group=None):
+        record_id = self._set_dict_record(name, population, area, group)
+        self._index_add(self._dict_index, record_id)
+
+    ## Adds records to the indexes of every metric at once
+    #  @param indexes the indexes of the list or the dictionary
+    #  @param record_ids the ids of the records
+    #
+    def _index_add_many(self, indexes, record_ids):
+        populations, areas = self._populations, self._areas
+        for metric, compute in self._METRICS.items():
+            keys = [compute(populations[i], areas[i]) for i in record_ids]
+            indexes[metric].add_many(keys, record_ids)
+
+    ## Adds many countries to the country list at once
+    #  @param names the names of the countries
+    #  @param populations the populations of the countries
+    #  @param areas the areas of the countries
+    #  @param groups the groups of the countries, or None if the countries have no group
+    #
+    def addCountriesToList(self, names, populations, areas, groups=None):
+        if groups is None:
+            groups = itertools.repeat(None)
+        record_ids = []
+        for name, population, area, group in zip(names, populations, areas, groups):
+            record_id = self._record(name, population, area, group, True)
+            # Marked right away, so a repeated country in the same chunk gets a record of its own
+            self._in_list[record_id] = 1
+            self._list_orders[record_id] = next(self._list_order)
+            record_ids.append(record_id)
+        self._list_records.extend(record_ids)
+
+        self._index_add_many(self._list_index, record_ids)
+        for record_id in record_ids:
+            self._group_add(self._list_groups, self._list_orders, record_id)
+
+    ## Adds many countries to the country dictionary at once, replacing countries whose name already exists
+    #  @param names the names of the countries
+    #  @param populations the populations of the countries
+    #  @param areas the areas of the countries
+    #  @param groups the groups of the countries, or None if the countries have no group
+    #
+    def addCountriesToDict(self, names, populations, areas, groups=None):
+        if groups is None:
+            groups = itertools.repeat(None)
+        added = {}
+        for name, population, area, group in zip(names, populations, areas, groups):
+            added[name] = self._set_dict_record(name, population, area, group)
+        # Only the last record of a name repeated in the chunk is in the dictionary
+        self._index_add_many(self._dict_index, array.array("q", added.values()))
+
+    ## Removes the first country with the given name from the country list
+    #  @param name the name of the country
+    #  @return True if a country was removed, False otherwise
+    #
+    def removeCountryFromList(self, name):
+        names = self._names
+        for position, record_id in enumerate(self._list_records):
+            if names[record_id] == name:
+                del self._list_records[position]
+                self._index_remove(self._list_index, record_id)
+                self._group_remove(self._list_groups, record_id)
+                self._in_list[record_id] = 0
+                self._release(record_id)
+                return True
+        return False
+
+    ## Removes a country from the country dictionary
+    #  @param name the name of the country
+    #  @return True if the country was removed, False otherwise
+    #
+    def removeCountryFromDict(self, name):
+        if name not in self._dict_records:
+            return False
+        record_id = self._dict_records.pop(name)
+        self._index_remove(self._dict_index, record_id)
+        self._group_remove(self._dict_groups, record_id)
+        self._release(record_id)
+        return True
+
+    ## Checks that a metric can be queried
+    #  @param metric the name of the metric
+    #
+    def _check_metric(self, metric):
+        if metric not in self._METRICS:
+            raise ValueError(f"Unknown metric '{metric}'. Choose one of: {', '.join(self._METRICS)}.")
+
+    ## Gets the names of records
+    #  @param record_ids the ids of the records
+    #  @return a list of names
+    #
+    def _names_of(self, record_ids):
+        return [self._names[i] for i in record_ids]
+
+    ## Retrieves the k countries with the largest value of a metric from the country list
+    #  @param metric the metric to rank by, one of "area", "population" or "density"
+    #  @param k the number of countries to return
+    #  @return the names of at most k countries, largest first
+    #
+    def list_top(self, metric, k):
+        self._check_metric(metric)
+        return self._names_of(self._list_index[metric].top(k))
+
+    ## Retrieves the k countries with the largest value of a metric from the country dictionary
+    #  @param metric the metric to rank by, one of "area", "population" or "density"
+    #  @param k the number of countries to return
+    #  @return the names of at most k countries, largest first
+    #
+    def dict_top(self, metric, k):
+        self._check_metric(metric)
+        return self._names_of(self._dict_index[metric].top(k))
+
+    ## Retrieves the k countries with the smallest value of a metric from the country list
+    #  @param metric the metric to rank by, one of "area", "population" or "density"
+    #  @param k the number of countries to return
+    #  @return the names of at most k countries, smallest first
+    #
+    def list_bottom(self, metric, k):
+        self._check_metric(metric)
+        return self._names_of(self._list_index[metric].bottom(k))
+
+    ## Retrieves the k countries with the smallest value of a metric from the country dictionary
+    #  @param metric the metric to rank by, one of "area", "population" or "density"
+    #  @param k the number of countries to return
+    #  @return the names of at most k countries, smallest first
+    #
+    def dict_bottom(self, metric, k):
+        self._check_metric(metric)
+        return self._names_of(self._dict_index[metric].bottom(k))
+
+    ## Retrieves the countries from the country list with a metric between two values
+    #  @param metric the metric to filter on, one of "area", "population" or "density"
+    #  @param low the lower bound, included
+    #  @param high the upper bound, included
+    #  @return the names of the countries in ascending order of the metric
+    #
+    def list_between(self, metric, low, high):
+        self._check_metric(metric)
+        return self._names_of(self._list_index[metric].between(low, high))
+
+    ## Retrieves the countries from the country dictionary with a metric between two values
+    #  @param metric the metric to filter on, one of "area", "population" or "density"
+    #  @param low the lower bound, included
+    #  @param high the upper bound, included
+    #  @return the names of the countries in ascending order of the metric
     #
-    def addCountryToDict(self, name, population, area):
-        new_country = {
-            "population": population,
-            "area": area
+    def dict_between(self, metric, low, high):
+        self._check_metric(metric)
+        return self._names_of(self._dict_index[metric].between(low, high))
+
+    ## Computes a percentile of a metric over the country list
+    #  @param metric the metric, one of "area", "population" or "density"
+    #  @param p the percentile between 0 and 100, e.g. 50 for the median
+    #  @return the percentile or None if the list is empty
+    #
+    def list_percentile(self, metric, p):
+        self._check_metric(metric)
+        if not 0 <= p <= 100:
+            raise ValueError("The percentile must be between 0 and 100.")
+        if not self._list_records:
+            print("The country list is empty.")
+            return
+        return self._list_index[metric].percentile(p)
+
+    ## Computes a percentile of a metric over the country dictionary
+    #  @param metric the metric, one of "area", "population" or "density"
+    #  @param p the percentile between 0 and 100, e.g. 50 for the median
+    #  @return the percentile or None if the dictionary is empty
+    #
+    def dict_percentile(self, metric, p):
+        self._check_metric(metric)
+        if not 0 <= p <= 100:
+            raise ValueError("The percentile must be between 0 and 100.")
+        if not self._dict_records:
+            print("The country list is empty.")
+            return
+        return self._dict_index[metric].percentile(p)
+
+    ## Computes the rollup of a group from its running totals
+    #  @param stats the running totals of the group
+    #  @return a dictionary with the number of countries, total population and area, the area-weighted
+    #      population density and the names of the largest country by area, population and density
+    #
+    def _rollup(self, stats):
+        rollup = {
+            "countries": stats.countries,
+            "population": stats.population,
+            "area": stats.area,
+            "density": _density(stats.population, stats.area),
         }
-        self._country_dict[name] = new_country
+        for metric, index in stats.largest.items():
+            rollup[f"largest_{metric}"] = self._names[index.max()]
+        return rollup
+
+    ## Retrieves the rollup of every group in the country list
+    #  Countries added without a group are not part of any rollup.
+    #  @return a dictionary from group to rollup, see _rollup
+    #
+    def list_group_rollups(self):
+        return {group: self._rollup(stats) for group, stats in self._list_groups.items()}
+
+    ## Retrieves the rollup of every group in the country dictionary
+    #  Countries added without a group are not part of any rollup.
+    #  @return a dictionary from group to rollup, see _rollup
+    #
+    def dict_group_rollups(self):
+        return {group: self._rollup(stats) for group, stats in self._dict_groups.items()}
+
+    ## Retrieves the rollup of one group in the country list
+    #  @param group the group
+    #  @return the rollup, see _rollup, or None if no country in the list belongs to the group
+    #
+    def list_group_rollup(self, group):
+        if group not in self._list_groups:
+            return None
+        return self._rollup(self._list_groups[group])
+
+    ## Retrieves the rollup of one group in the country dictionary
+    #  @param group the group
+    #  @return the rollup, see _rollup, or None if no country in the dictionary belongs to the group
+    #
+    def dict_group_rollup(self, group):
+        if group not in self._dict_groups:
+            return None
+        return self._rollup(self._dict_groups[group])
 
     ## Retrieves the country with the largest area from the country list
     #  @return the Country name with the largest area or None if the list is empty
     #
     def list_largest_area(self):
-        if not self._country_list:
+        if not self._list_records:
             print("The country list is empty.")
             return
 
-        # By specifying a lambda function in the key of the max function, we can
-        # maximize over the area of all countries but return the respective country object
-        largest_country = max(self._country_list, key=lambda i: i.area)
-                
-        return largest_country.name
+        # The area index keeps the country with the largest area at its end
+        return self._names[self._list_index["area"].max()]
 
     ## Retrieves the country with the largest population from the country list
     #  @return the Country name with the largest population or None if the list is empty
     #
     def list_largest_population(self):
-        if not self._country_list:
+        if not self._list_records:
             print("The country list is empty.")
             return
-        
-        # By specifying a lambda function in the key of the max function, we can
-        # maximize over the population of all countries but return the respective country object
-        largest_country = max(self._country_list, key=lambda i: i.population)
-                
-        return largest_country.name
-    
+
+        # The population index keeps the country with the largest population at its end
+        return self._names[self._list_index["population"].max()]
+
     ## Retrieves the country with the largest population density from the country list
     #  @return the Country name with the largest population density or None if the list is empty
     #
     def list_largest_pop_density(self):
-        if not self._country_list:
+        if not self._list_records:
             print("The country list is empty.")
             return
-        
-        # By specifying a lambda function in the key of the max function, we can
-        # maximize over the population density of all countries but return the respective country object
-        largest_country = max(self._country_list, key=lambda i: i.popDensity)
-                
-        return largest_country.name
-    
+
+        # The density index keeps the country with the largest population density at its end
+        return self._names[self._list_index["density"].max()]
+
     ## Retrieves the country with the largest area from the country dictionary
     #  @return the name for the country with the largest area or None if the dictionary is empty
     #
     def dict_largest_area(self):
-        if not self._country_dict:
+        if not self._dict_records:
             print("The country list is empty.")
             return
 
-        # By passing a lambda function to the key parameter of the max function, we can maximize 
-        # over the areas but return the tuple from .items() corresponding to the country with the largest area
-        largest_country = max(self._country_dict.items(), key=lambda i: i[1]["area"])
-                
-        return largest_country[0] # Return just the country name
+        return self._names[self._dict_index["area"].max()]
 
     ## Retrieves the country with the largest population from the country dictionary
     #  @return the name for the country with the largest population or None if the dictionary is empty
     #
     def dict_largest_population(self):
-        if not self._country_dict:
+        if not self._dict_records:
             print("The country list is empty.")
             return
-        
-        # By passing a lambda function to the key parameter of the max function, we can maximize 
-        # over the populations but return the tuple from .items() corresponding to the country with the largest area
-        largest_country = max(self._country_dict.items(), key=lambda i: i[1]["population"])
-                
-        return largest_country[0] # Return just the country name
-        
+
+        return self._names[self._dict_index["population"].max()]
+
     ## Retrieves the country with the largest population density from the country dictionary
     #  @return the name for the country with the largest population density or None if the dictionary is empty
     #
     def dict_largest_pop_density(self):
-        if not self._country_dict:
+        if not self._dict_records:
             print("The country list is empty.")
             return
-        
-        # By passing a lambda function to the key parameter of the max function, we can maximize 
-        # over the population densities but return the tuple from .items() corresponding to the country with the largest area
-        largest_country = max(self._country_dict.items(), key=lambda i: i[1]["population"]/i[1]["area"])
-                
-        return largest_country[0] # Return just the country name
+
+        return self._names[self._dict_index["density"].max()]
+
+
+## Reads countries from a file in chunks, so that files larger than memory can be loaded
+#  CSV files must have the columns name, population and area, optionally followed by a group
+#  column, and may start with a header row. Blank rows are skipped, and a row without a group
+#  field, or with an empty one, has the group None. Parquet files (.parquet) must
+#  have columns with the same names, where the group column is optional, and require pyarrow.
+#  @param file_name the name of the file
+#  @param chunk_size the number of rows per chunk
+#  @param header True if the CSV file starts with a header row, False if it does not, or None to
+#      treat the first row as a header when its first columns are named name, population and area
+#  @return a generator of (names, populations, areas, groups) lists with at most chunk_size rows each,
+#      where groups is None if no row of the chunk has a group field
+#  @raise ValueError if a CSV row does not have 3 or 4 fields
+#
+def read_countries(file_name, chunk_size=100000, header=None):
+    if file_name.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet files requires pyarrow. Install it with: pip install pyarrow")
+        parquet_file = pq.ParquetFile(file_name)
+        columns = ["name", "population", "area"]
+        has_group = "group" in parquet_file.schema_arrow.names
+        if has_group:
+            columns.append("group")
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield (batch.column("name").to_pylist(),
+                   batch.column("population").to_pylist(),
+                   batch.column("area").to_pylist(),
+                   batch.column("group").to_pylist() if has_group else None)
+        return
+
+    with open(file_name, newline="") as file:
+        reader = csv.reader(file)
+        rows = (_check_row(row, file_name, reader.line_num)
+                for row in reader if any(field.strip() for field in row))
+        first = next(rows, None)
+        if first is None:
+            return
+        if header is None:
+            header = [field.strip().lower() for field in first[:3]] == ["name", "population", "area"]
+        if not header:
+            rows = itertools.chain([first], rows)
+
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            if len(set(map(len, chunk))) > 1:
+                # Rows without a group field are padded, so every row has the same width
+                chunk = [row if len(row) == 4 else row + [None] for row in chunk]
+            # Transposing the chunk gives one list per column, which is converted with a single map
+            columns = list(zip(*chunk))
+            yield (list(columns[0]), list(map(int, columns[1])), list(map(float, columns[2])),
+                   [group or None for group in columns[3]] if len(columns) > 3 else None)
+
+
+## Checks that a CSV row read by read_countries has the fields name, population, area and an optional group
+#  @param row the fields of the row
+#  @param file_name the name of the file, for the error message
+#  @param line_number the line number of the row, for the error message
+#  @return the row
+#  @raise ValueError if the row does not have 3 or 4 fields
+#
+def _check_row(row, file_name, line_number):
+    if not 3 <= len(row) <= 4:
+        raise ValueError(f"{file_name}, line {line_number}: expected the fields name, population, area "
+                         f"and an optional group, but the row has {len(row)} fields.")
+    return row
 
 
 ## A simple test of the Country class
@@ -1,5 +1,5 @@
-import argparse, textwrap
-from P9_23_module import CountryCollection
+import argparse, textwrap, time
+from P9_23_module import CountryCollection, read_countries
 
 
 ## Documenting and testing the CountryCollection class using the argparse library
@@ -24,6 +24,13 @@ parser = argparse.ArgumentParser(prog='CountryCollection',
                                 Similarly for the dictionary methods use --add_dict, e.g., 
                                 "--add_dict USA 331002651 9833517 --add_dict Canada 
                                 37590000 9984670 --dict_largest_density".
+                                Large datasets can be loaded from a CSV file with the
+                                columns name, population and area (or a Parquet file
+                                with the same columns) using --load, e.g., "--load 
+                                countries.csv --load_into list --list_largest_area".
+                                An optional fourth column assigns each country to a
+                                group, e.g., its continent, and --list_rollups or
+                                --dict_rollups print the totals of every group.
                                 
                                 '''),
     epilog=textwrap.dedent('''\
@@ -46,6 +53,18 @@ parser.add_argument("--add_list", nargs=3, action='append', metavar=('name', 'po
 parser.add_argument("--add_dict", nargs=3, action='append', metavar=('name', 'population', 'area'), 
                     help="Add a country to the dictionary with its name, population, and area. Repeat for each country.")
 
+## Loads countries from a CSV or Parquet file in chunks
+#  The file is streamed, so only one chunk of rows is held in memory besides the collection itself.
+#
+parser.add_argument("--load", metavar="FILE",
+                    help="Load countries from a CSV file with the columns name, population, area and optionally group, or a Parquet file with the same columns.")
+parser.add_argument("--load_into", choices=["list", "dict", "both"], default="both",
+                    help="Load the countries from --load into the list, the dictionary, or both.")
+parser.add_argument("--chunk_size", type=int, default=100000,
+                    help="Number of rows read from --load at a time.")
+parser.add_argument("--header", choices=["auto", "yes", "no"], default="auto",
+                    help="Whether the CSV file from --load starts with a header row. With auto, the first row is a header if its columns are named name, population and area.")
+
 ## Add the list arguments
 parser.add_argument("--list_largest_area", action="store_true", 
                     help="Display the country with the largest area from the country list.")
@@ -54,6 +73,12 @@ parser.add_argument("--list_largest_population", action="store_true",
 parser.add_argument("--list_largest_density", action="store_true", 
                     help="Display the country with the largest population density from the country list.")
 
+## Add the group arguments
+parser.add_argument("--list_rollups", action="store_true", 
+                    help="Display the total population, area, density and largest members of every group in the country list.")
+parser.add_argument("--dict_rollups", action="store_true", 
+                    help="Display the total population, area, density and largest members of every group in the country dictionary.")
+
 ## Add the dictionary arguments
 parser.add_argument("--dict_largest_area", action="store_true", 
                     help="Display the country with the largest area from the country dictionary.")
@@ -78,6 +103,20 @@ if args.add_dict:
         name, population, area = country
         country_collection.addCountryToDict(name, int(population), float(area))
 
+## Countries from a file are added one chunk at a time with the bulk methods
+if args.load:
+    start = time.perf_counter()
+    rows = 0
+    header = {"auto": None, "yes": True, "no": False}[args.header]
+    for names, populations, areas, groups in read_countries(args.load, args.chunk_size, header):
+        if args.load_into in ("list", "both"):
+            country_collection.addCountriesToList(names, populations, areas, groups)
+        if args.load_into in ("dict", "both"):
+            country_collection.addCountriesToDict(names, populations, areas, groups)
+        rows += len(names)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {rows} countries from {args.load} in {elapsed:.2f} s ({rows / max(elapsed, 1e-9):.0f} rows/sec).")
+
 # List methods
 if args.list_largest_area:
     print("The country with the largest area, using the list method, is:", 
@@ -99,3 +138,11 @@ if args.dict_largest_population:
 if args.dict_largest_density:
     print("The country with the largest population density, using the dictionary method, is:",
           country_collection.dict_largest_pop_density())
+
+# Group rollups
+if args.list_rollups:
+    for group, rollup in country_collection.list_group_rollups().items():
+        print(f"Group {group}, using the list method:", rollup)
+if args.dict_rollups:
+    for group, rollup in country_collection.dict_group_rollups().items():
+        print(f"Group {group}, using the dictionary method:", rollup)
@@ -1,13 +1,661 @@
+import array, atexit, bisect, collections, heapq, itertools, json, mmap, os, re, struct, threading, time, zlib
+
+
+
+## A message body stored as a list of lines that is only joined into one string when it is read
+#  Appending a line is O(1), and the joined text is cached until the next append, so building a
+#  long message is linear in its length instead of copying the whole body on every append.
+#
+class _MessageBody:
+
+    ## Constructs an empty message body
+    #
+    def __init__(self):
+        self._lines = []
+        self._text = ""
+        self._length = 0
+
+    ## Appends a line of text together with a newline character
+    #  @param line the line of text
+    #
+    def append(self, line):
+        self._lines.append(line + "\n")
+        self._length += len(line) + 1
+        self._text = None
+
+    ## Gets the number of characters in the body without joining the lines
+    #  @return the length of the body
+    #
+    def __len__(self):
+        return self._length
+
+    ## Joins the lines into one string, or returns the cached string if nothing has been appended since
+    #  @return the body as a string
+    #
+    def __str__(self):
+        if self._text is None:
+            self._text = "".join(self._lines)
+        return self._text
+
+    ## Represents the body like the string it holds, so a printed log looks like a dictionary of strings
+    #
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, _MessageBody):
+            other = str(other)
+        return str(self) == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+## A bounded, thread-safe log of the latest body of every (sender, recipient) pair
+#  The entries are spread over shards by sender, and every shard has its own lock, so threads
+#  logging for different senders rarely wait for each other. Each shard keeps its entries in
+#  least recently used order and evicts from the front when the shard exceeds its share of
+#  max_bytes or an entry has not been used for ttl seconds. Reads return the bodies as str, so
+#  the log reads like the dictionary of strings it replaces, whichever body objects are logged.
+#
+class MessageLog:
+
+    ## Constructs an empty log
+    #  @param max_bytes the maximum total size of the logged bodies, counted in characters, or None for no limit
+    #  @param ttl the number of seconds an entry is kept after it was last logged or read, or None to keep it
+    #  @param shards the number of shards
+    #  @param store_references True to log a reference to the body of a message, which is updated
+    #      with the message, or False to log a copy of the body as it is when the line is logged
+    #
+    def __init__(self, max_bytes=None, ttl=None, shards=16, store_references=True):
+        self._max_shard_bytes = None if max_bytes is None else max_bytes / shards
+        self._ttl = ttl
+        self._store_references = store_references
+        self._shards = [_LogShard() for _ in range(shards)]
+        self._sequence = itertools.count()
+
+    ## Gets the shard of a sender
+    #  crc32 is used instead of hash() so the shard, and therefore the log order, is the same in every run.
+    #  @param sender the name of the sender
+    #  @return the shard
+    #
+    def _shard(self, sender):
+        return self._shards[zlib.crc32(str(sender).encode()) % len(self._shards)]
+
+    ## Logs the body of a message
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @param body the message body
+    #
+    def put(self, sender, recipient, body):
+        if not self._store_references:
+            body = str(body)
+        now = time.monotonic() if self._ttl is not None else 0
+        size = len(body)
+        shard = self._shard(sender)
+        with shard.lock:
+            key = (sender, recipient)
+            entry = shard.entries.get(key)
+            if entry is not None:
+                shard.size += size - entry[1]
+                shard.entries[key] = (body, size, now, entry[3])
+                shard.entries.move_to_end(key)
+            else:
+                shard.recipients.setdefault(sender, {})[recipient] = None
+                shard.entries[key] = (body, size, now, next(self._sequence))
+                shard.size += size
+            if self._ttl is not None or self._max_shard_bytes is not None:
+                self._evict(shard, now)
+
+    ## Evicts expired entries and least recently used entries until the shard is within its size limit
+    #  The caller must hold the lock of the shard.
+    #  @param shard the shard
+    #  @param now the current monotonic time
+    #
+    def _evict(self, shard, now):
+        while shard.entries:
+            key, (_, size, used, _) = next(iter(shard.entries.items()))
+            expired = self._ttl is not None and now - used > self._ttl
+            # The entry that was just logged is kept even if it alone exceeds the limit
+            too_large = (self._max_shard_bytes is not None and shard.size > self._max_shard_bytes
+                         and len(shard.entries) > 1)
+            if not (expired or too_large):
+                break
+            del shard.entries[key]
+            shard.size -= size
+            recipients = shard.recipients[key[0]]
+            del recipients[key[1]]
+            if not recipients:
+                del shard.recipients[key[0]]
+
+    ## Evicts the expired entries of a shard before it is read, so no read returns an expired entry
+    #  The caller must hold the lock of the shard.
+    #  @param shard the shard
+    #
+    def _expire(self, shard):
+        if self._ttl is not None:
+            self._evict(shard, time.monotonic())
+
+    ## Gets the logged body of a message and marks it as recently used
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @return the body as a string, or None if it is not in the log
+    #
+    def get(self, sender, recipient):
+        now = time.monotonic() if self._ttl is not None else 0
+        shard = self._shard(sender)
+        with shard.lock:
+            self._evict(shard, now)
+            entry = shard.entries.get((sender, recipient))
+            if entry is None:
+                return None
+            shard.entries[(sender, recipient)] = entry[:2] + (now,) + entry[3:]
+            shard.entries.move_to_end((sender, recipient))
+            return str(entry[0])
+
+    ## Gets the logged bodies of all messages from a sender
+    #  @param sender the name of the message sender
+    #  @return a dictionary from recipient to body string
+    #
+    def __getitem__(self, sender):
+        shard = self._shard(sender)
+        with shard.lock:
+            self._expire(shard)
+            if sender not in shard.recipients:
+                raise KeyError(sender)
+            return {recipient: str(shard.entries[(sender, recipient)][0]) for recipient in shard.recipients[sender]}
+
+    def __contains__(self, sender):
+        shard = self._shard(sender)
+        with shard.lock:
+            self._expire(shard)
+            return sender in shard.recipients
+
+    def __len__(self):
+        length = 0
+        for shard in self._shards:
+            with shard.lock:
+                self._expire(shard)
+                length += len(shard.entries)
+        return length
+
+    ## Gets the total size of the logged bodies
+    #  @return the size counted in characters
+    #
+    def size(self):
+        size = 0
+        for shard in self._shards:
+            with shard.lock:
+                self._expire(shard)
+                size += shard.size
+        return size
+
+    ## Copies the log into a dictionary of dictionaries, in the order the (sender, recipient) pairs were first logged
+    #  @return a dictionary from sender to a dictionary from recipient to body string
+    #
+    def to_dict(self):
+        entries = []
+        for shard in self._shards:
+            with shard.lock:
+                self._expire(shard)
+                entries.extend((sequence, key, str(body)) for key, (body, _, _, sequence) in shard.entries.items())
+        log = {}
+        for _, (sender, recipient), body in sorted(entries, key=lambda entry: entry[0]):
+            log.setdefault(sender, {})[recipient] = body
+        return log
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+## One shard of a MessageLog
+#
+class _LogShard:
+    __slots__ = ("lock", "entries", "recipients", "size")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (sender, recipient) -> (body, size, last used, sequence), least recently used first
+        self.entries = collections.OrderedDict()
+        # sender -> recipients with an entry, to look up all messages from a sender
+        self.recipients = {}
+        self.size = 0
+
+
+## An append-only on-disk journal of every line appended to any message
+#  The journal is a directory with three files:
+#    journal.dat   the lines, as records of a 4-byte length, a 1-byte flag and the UTF-8 encoded
+#                  line, which is zlib-compressed when the flag is 1
+#    journal.idx   one 12-byte entry per record with the id of its (sender, recipient) pair and
+#                  the offset of the record in journal.dat
+#    journal.pairs one JSON [sender, recipient] line per pair id
+#  Appends are buffered and written in groups, and the files are only fsynced every fsync_every
+#  records or fsync_interval seconds, so many appends share one write and one fsync. Reopening a
+#  journal reads the small index and pair files instead of the data, and reads of the lines of a
+#  pair go through a memory map of journal.dat. A journal that is not closed is closed when the
+#  interpreter exits, so the buffered records are written, and it can be used in a with statement.
+#
+class MessageJournal:
+    _RECORD = struct.Struct("<IB")
+    _INDEX = struct.Struct("<IQ")
+
+    ## Opens a journal, creating the directory if it does not exist
+    #  @param directory the directory of the journal
+    #  @param compress True to compress lines with zlib when that makes them shorter
+    #  @param batch_bytes the number of buffered bytes that triggers a write to the files
+    #  @param fsync_every the number of records between two fsyncs, or None to only fsync on commit()
+    #  @param fsync_interval the maximum number of seconds between two fsyncs, or None for no time limit
+    #
+    def __init__(self, directory, compress=False, batch_bytes=1 << 20, fsync_every=10000, fsync_interval=1.0):
+        os.makedirs(directory, exist_ok=True)
+        self._compress = compress
+        self._batch_bytes = batch_bytes
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+
+        self._pairs = []
+        self._pair_ids = {}
+        self._offsets = collections.defaultdict(lambda: array.array("Q"))
+        self._data_buffer = bytearray()
+        self._index_buffer = bytearray()
+        self._pairs_buffer = []
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._map = None
+
+        self._data = open(os.path.join(directory, "journal.dat"), "a+b")
+        self._index = open(os.path.join(directory, "journal.idx"), "a+b")
+        self._pairs_file = open(os.path.join(directory, "journal.pairs"), "a+", encoding="utf-8")
+        self._size = self._replay_index()
+        self._closed = False
+        atexit.register(self.close)
+
+    ## Rebuilds the in-memory offset index from journal.pairs and journal.idx
+    #  Index entries whose record does not end inside journal.dat, which were written before a crash
+    #  interrupted the data write, are dropped, and records written after the last index entry
+    #  are indexed by scanning only that tail of journal.dat. journal.dat is truncated after the
+    #  last complete record.
+    #  @return the size of journal.dat after dropping an incomplete last record
+    #
+    def _replay_index(self):
+        self._pairs_file.seek(0)
+        for line in self._pairs_file:
+            key = tuple(json.loads(line))
+            self._pair_ids[key] = len(self._pairs)
+            self._pairs.append(key)
+
+        data_size = os.fstat(self._data.fileno()).st_size
+        self._index.seek(0)
+        entries = self._index.read()
+        entries = entries[:len(entries) - len(entries) % self._INDEX.size]
+        # Records are contiguous, so every entry must start where the previous record ends and
+        # its whole record, header and payload, must be inside journal.dat
+        end = 0
+        valid = 0
+        for pair_id, offset in self._INDEX.iter_unpack(entries):
+            if offset != end or pair_id >= len(self._pairs) or offset + self._RECORD.size > data_size:
+                break
+            length = self._RECORD.unpack(self._read(offset, self._RECORD.size))[0]
+            if offset + self._RECORD.size + length > data_size:
+                break
+            self._offsets[pair_id].append(offset)
+            valid += self._INDEX.size
+            end = offset + self._RECORD.size + length
+        if valid != os.fstat(self._index.fileno()).st_size:
+            self._index.truncate(valid)
+
+        # Index the records after the last indexed record, and drop a record cut short by a crash
+        while end + self._RECORD.size <= data_size:
+            length, flag = self._RECORD.unpack(self._read(end, self._RECORD.size))
+            if end + self._RECORD.size + length > data_size:
+                break
+            sender, recipient, _ = self._decode(self._read(end + self._RECORD.size, length), flag)
+            pair_id = self._pair_id(sender, recipient)
+            self._offsets[pair_id].append(end)
+            self._index.write(self._INDEX.pack(pair_id, end))
+            end += self._RECORD.size + length
+        if end < data_size:
+            self._data.truncate(end)
+        self._flush_pairs()
+        self._index.flush()
+        return end
+
+    ## Reads bytes from journal.dat with a plain file read, used while replaying
+    #  @param offset the offset to read from
+    #  @param size the number of bytes
+    #  @return the bytes
+    #
+    def _read(self, offset, size):
+        self._data.seek(offset)
+        return self._data.read(size)
+
+    ## Decodes the payload of a record
+    #  @param payload the bytes after the record header
+    #  @param flag 1 if the payload is compressed, 0 otherwise
+    #  @return the sender, recipient and line
+    #
+    def _decode(self, payload, flag):
+        if flag:
+            payload = zlib.decompress(payload)
+        return tuple(payload.decode("utf-8").split("\0", 2))
+
+    ## Gets the id of a (sender, recipient) pair, assigning a new id the first time the pair is seen
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @return the id of the pair
+    #
+    def _pair_id(self, sender, recipient):
+        key = (sender, recipient)
+        pair_id = self._pair_ids.get(key)
+        if pair_id is None:
+            pair_id = self._pair_ids[key] = len(self._pairs)
+            self._pairs.append(key)
+            self._pairs_buffer.append(json.dumps(key) + "\n")
+        return pair_id
+
+    ## Appends a line to the journal
+    #  The line is buffered and written with the next group of records.
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @param line the line of text
+    #
+    def append(self, sender, recipient, line):
+        payload = f"{sender}\0{recipient}\0{line}".encode("utf-8")
+        flag = 0
+        if self._compress:
+            compressed = zlib.compress(payload)
+            if len(compressed) < len(payload):
+                payload, flag = compressed, 1
+
+        with self._lock:
+            pair_id = self._pair_id(sender, recipient)
+            offset = self._size + len(self._data_buffer)
+            self._data_buffer += self._RECORD.pack(len(payload), flag)
+            self._data_buffer += payload
+            self._index_buffer += self._INDEX.pack(pair_id, offset)
+            self._offsets[pair_id].append(offset)
+            self._unsynced += 1
+
+            if len(self._data_buffer) >= self._batch_bytes:
+                self._write()
+            if ((self._fsync_every is not None and self._unsynced >= self._fsync_every)
+                    or (self._fsync_interval is not None and time.monotonic() - self._last_sync >= self._fsync_interval)):
+                self._sync()
+
+    ## Writes the pair names buffered since the last write
+    #  The caller must hold the lock.
+    #
+    def _flush_pairs(self):
+        if self._pairs_buffer:
+            self._pairs_file.write("".join(self._pairs_buffer))
+            self._pairs_buffer.clear()
+        self._pairs_file.flush()
+
+    ## Writes the buffered records to the files, the data before the index so the index never points to missing data
+    #  The caller must hold the lock.
+    #
+    def _write(self):
+        self._flush_pairs()
+        self._data.write(self._data_buffer)
+        self._data.flush()
+        self._size += len(self._data_buffer)
+        self._index.write(self._index_buffer)
+        self._index.flush()
+        self._data_buffer.clear()
+        self._index_buffer.clear()
+
+    ## Writes the buffered records and fsyncs the files
+    #  The caller must hold the lock.
+    #
+    def _sync(self):
+        self._write()
+        os.fsync(self._data.fileno())
+        os.fsync(self._index.fileno())
+        os.fsync(self._pairs_file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    ## Writes and fsyncs every record appended so far
+    #
+    def commit(self):
+        with self._lock:
+            self._sync()
+
+    ## Reads the lines of all messages from a sender to a recipient, in the order they were appended
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @return a list of lines
+    #
+    def lines(self, sender, recipient):
+        with self._lock:
+            pair_id = self._pair_ids.get((sender, recipient))
+            if pair_id is None:
+                return []
+            self._write()
+            # The map is only recreated when the file has grown since it was mapped
+            if self._map is None or len(self._map) < self._size:
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._data.fileno(), self._size, access=mmap.ACCESS_READ)
+
+            lines = []
+            for offset in self._offsets[pair_id]:
+                length, flag = self._RECORD.unpack_from(self._map, offset)
+                start = offset + self._RECORD.size
+                lines.append(self._decode(self._map[start:start + length], flag)[2])
+            return lines
+
+    ## Gets the (sender, recipient) pairs in the journal
+    #  @return a list of (sender, recipient) tuples
+    #
+    def pairs(self):
+        with self._lock:
+            return list(self._pairs)
+
+    ## Commits the buffered records and closes the files, closing a closed journal does nothing
+    #
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self.commit()
+        if self._map is not None:
+            self._map.close()
+        self._data.close()
+        self._index.close()
+        self._pairs_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+## An inverted index over the lines of all messages for full-text search
+#  Every indexed line gets a line id, and the index keeps the message and the line number of every
+#  line id in compact integer arrays. Every token maps to a sorted array of the ids of the lines it
+#  occurs in, so a query only reads the postings of its tokens instead of scanning the messages.
+#  Tokens are the lower-cased words of a line.
+#
+class MessageIndex:
+    _TOKEN = re.compile(r"\w+")
+
+    ## Constructs an empty index
+    #
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = collections.defaultdict(lambda: array.array("L"))
+        self._messages = []
+        self._message_ids = {}
+        self._line_message = array.array("L")
+        self._line_number = array.array("L")
+
+    ## Splits a text into tokens
+    #  @param text the text
+    #  @return a list of lower-cased words
+    #
+    @classmethod
+    def tokenize(cls, text):
+        return cls._TOKEN.findall(text.lower())
+
+    ## Indexes the line that was just appended to a message body
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @param body the body of the message, which the index keeps to read the lines back
+    #  @param line the line of text, which must be the last line of the body
+    #
+    def add(self, sender, recipient, body, line):
+        with self._lock:
+            # The body itself is kept in _messages, so its id() stays unique while it is indexed
+            message_id = self._message_ids.get(id(body))
+            if message_id is None:
+                message_id = self._message_ids[id(body)] = len(self._messages)
+                self._messages.append((sender, recipient, body))
+            line_id = len(self._line_message)
+            self._line_message.append(message_id)
+            self._line_number.append(len(body._lines) - 1)
+
+            for token in self.tokenize(line):
+                postings = self._postings[token]
+                # A token that occurs several times in the line is only posted once
+                if not postings or postings[-1] != line_id:
+                    postings.append(line_id)
+
+    ## Gets the postings of a token without creating an empty entry for unknown tokens
+    #  @param token the token
+    #  @return the array of line ids
+    #
+    def _get(self, token):
+        return self._postings.get(token, ())
+
+    ## Intersects sorted postings, starting from the shortest and binary searching the others
+    #  @param postings a list of sorted line id arrays
+    #  @return a sorted list of the line ids in all of them
+    #
+    @staticmethod
+    def _intersect(postings):
+        if not postings:
+            return []
+        postings = sorted(postings, key=len)
+        result = list(postings[0])
+        for other in postings[1:]:
+            kept = []
+            start = 0
+            for line_id in result:
+                start = bisect.bisect_left(other, line_id, start)
+                if start == len(other):
+                    break
+                if other[start] == line_id:
+                    kept.append(line_id)
+            result = kept
+            if not result:
+                break
+        return result
+
+    ## Converts line ids into search results
+    #  @param line_ids the line ids
+    #  @return a list of (sender, recipient, line number, line) tuples
+    #
+    def _results(self, line_ids):
+        results = []
+        for line_id in line_ids:
+            sender, recipient, body = self._messages[self._line_message[line_id]]
+            number = self._line_number[line_id]
+            results.append((sender, recipient, number, body._lines[number][:-1]))
+        return results
+
+    ## Finds the lines that contain all of the given words
+    #  @param words the words to search for
+    #  @return a list of (sender, recipient, line number, line) tuples in the order the lines were appended
+    #
+    def search_all(self, *words):
+        with self._lock:
+            tokens = [token for word in words for token in self.tokenize(word)]
+            return self._results(self._intersect([self._get(token) for token in tokens]))
+
+    ## Finds the lines that contain any of the given words
+    #  @param words the words to search for
+    #  @return a list of (sender, recipient, line number, line) tuples in the order the lines were appended
+    #
+    def search_any(self, *words):
+        with self._lock:
+            tokens = {token for word in words for token in self.tokenize(word)}
+            line_ids = [line_id for line_id, _ in itertools.groupby(heapq.merge(*[self._get(t) for t in tokens]))]
+            return self._results(line_ids)
+
+    ## Finds the lines that contain the words of a phrase next to each other and in order
+    #  The lines containing all the words are found with the postings, and only those lines are
+    #  tokenized to check the order.
+    #  @param phrase the phrase to search for
+    #  @return a list of (sender, recipient, line number, line) tuples in the order the lines were appended
+    #
+    def search_phrase(self, phrase):
+        tokens = self.tokenize(phrase)
+        if not tokens:
+            return []
+        with self._lock:
+            candidates = self._results(self._intersect([self._get(token) for token in set(tokens)]))
+        matches = []
+        for result in candidates:
+            line_tokens = self.tokenize(result[3])
+            if any(line_tokens[i:i + len(tokens)] == tokens for i in range(len(line_tokens) - len(tokens) + 1)):
+                matches.append(result)
+        return matches
+
 
 ## Defines a Message class with class variables to log all messages
 #  @classvar _no_messages will increase for every line that is added to any message. The name is
 #      therefore a bit missleading. To keep track of number of messages it would have to be updated
 #      in the constructor of every message
-#  @classvar _log will log every message in a dictionary
+#  @classvar _log will log every message in a MessageLog, which can be indexed like a dictionary
+#      of dictionaries. By default the log holds a reference to the body of every message, so
+#      logging a line does not copy the body, and it has no size limit. Use setLog() to replace it.
+#  @classvar _counter_lock makes the update of _no_messages atomic when lines are appended from several threads
+#  @classvar _journal is an optional MessageJournal that keeps every line on disk, set with setJournal()
+#  @classvar _bus is an optional MessageBus from P9_24_bus that every line is published to, set with setBus()
+#  @classvar _index is an optional MessageIndex that every line is added to for full-text search, set with setIndex()
 #  
 class Message:
     _no_messages = 0
-    _log = {}
+    _log = MessageLog()
+    _counter_lock = threading.Lock()
+    _journal = None
+    _bus = None
+    _index = None
+
+    ## Sets an index that every appended line is added to, or None to stop indexing
+    #  @param index a MessageIndex or None
+    #
+    @classmethod
+    def setIndex(cls, index):
+        cls._index = index
+
+    ## Sets a journal that every appended line is also written to, or None to stop journaling
+    #  @param journal a MessageJournal or None
+    #
+    @classmethod
+    def setJournal(cls, journal):
+        cls._journal = journal
+
+    ## Sets a bus that every appended line is published to, or None to stop publishing
+    #  append() publishes without waiting, so it must be called from the thread running the event loop
+    #  of the bus, and it raises asyncio.QueueFull without appending the line when the queue of the
+    #  recipient is full. appendAsync() waits for room in the queue instead.
+    #  @param bus a MessageBus or None
+    #
+    @classmethod
+    def setBus(cls, bus):
+        cls._bus = bus
+
+    ## Replaces the log of all messages, e.g. with a bounded MessageLog
+    #  @param log the new log, any object with a put(sender, recipient, body) method
+    #
+    @classmethod
+    def setLog(cls, log):
+        cls._log = log
 
     ## Constructs an empty message with a sender and a receiver
     #  @param sender the name of the message sender
@@ -16,35 +664,59 @@ class Message:
     def __init__(self, sender, recipient):
         self.sender = sender
         self.recipient = recipient
-        self._messageBody = ""
+        self._messageBody = _MessageBody()
+        self._string = None
     
     ## Append a new line of text to the message body together with a newline character
     #  @param line the line of text
+    #  @raise asyncio.QueueFull if a bus is set and the queue of the recipient is full, the line is then not appended
     def append(self, line):
-        self._messageBody = self._messageBody + line + "\n"
-        self._log_messages()
+        if Message._bus is not None:
+            Message._bus.check_room(self.recipient)
+        self._append(line)
+        if Message._bus is not None:
+            Message._bus.publish_nowait(self.sender, self.recipient, line)
+
+    ## Append a new line of text, waiting while the queue of the recipient on the bus is full
+    #  The line is published before the message changes, so an append that is cancelled while it
+    #  waits leaves the message unchanged.
+    #  @param line the line of text
+    async def appendAsync(self, line):
+        if Message._bus is not None:
+            await Message._bus.publish(self.sender, self.recipient, line)
+        self._append(line)
+
+    ## Appends a line to the message body and logs it, without publishing it
+    #  @param line the line of text
+    def _append(self, line):
+        self._messageBody.append(line)
+        self._string = None
+        self._log_messages(line)
     
     ## Convert message into one long line of text
+    #  The result is cached until the next line is appended.
     #
     def toString(self):
-        fromStr = f"From: {self.sender}\n"
-        toStr = f"To: {self.recipient}\n"
+        if self._string is None:
+            fromStr = f"From: {self.sender}\n"
+            toStr = f"To: {self.recipient}\n"
 
-        # repr() converts a string into its raw equivalent, in this case one line of text.
-        return repr(fromStr + toStr + self._messageBody)
+            # repr() converts a string into its raw equivalent, in this case one line of text.
+            self._string = repr(fromStr + toStr + str(self._messageBody))
+        return self._string
     
     ## Log the messages sent and increase the number of lines added to any message. 
+    #  @param line the line of text that was appended, which is written to the journal if one is set
     #
-    def _log_messages(self):
-        Message._no_messages += 1
-        # Check if sender exist in the dictionary
-        if self.sender in Message._log:
-            # Create the recipient for the sender if it does not exist or just update the message body if it exist
-            Message._log[self.sender][self.recipient] = self._messageBody
-        
-        # If sender does not exist, create sender with recipient and message body, and update number of messages
-        else:
-            Message._log[self.sender] = {self.recipient: self._messageBody}
+    def _log_messages(self, line):
+        with Message._counter_lock:
+            Message._no_messages += 1
+        # The log creates the sender and recipient if they do not exist or just updates the message body if they exist
+        Message._log.put(self.sender, self.recipient, self._messageBody)
+        if Message._journal is not None:
+            Message._journal.append(self.sender, self.recipient, line)
+        if Message._index is not None:
+            Message._index.add(self.sender, self.recipient, self._messageBody, line)
 
 
 ## Test program, only executed if this file is executed directly
@@ -0,0 +1,175 @@
+import argparse, asyncio, os, random, shutil, tempfile, time
+from P9_24 import Message, MessageIndex, MessageJournal
+from P9_24_bus import BusClient, MessageBus, serve_unix
+
+
+## Benchmarks for the Message class
+#  Run with e.g. "python P9_24_benchmark.py --lines 10000 100000" from this folder.
+#
+
+
+## Measures the cost of appending many lines to one message
+#  The baseline is the string concatenation Message.append used before the line buffer, which
+#  copies the whole body on every append. As it is quadratic, it is only run up to baseline_max lines.
+#  @param sizes the numbers of lines to append
+#  @param baseline_max the largest number of lines to run the baseline for
+#
+def bench_append(sizes, baseline_max):
+    line = "A line of text that is appended to the message body"
+    print(f"{'lines':>10} {'buffer s':>10} {'us/line':>9} {'concat s':>10} {'us/line':>9}")
+    for size in sizes:
+        start = time.perf_counter()
+        message = Message("Bob", "Alice")
+        for _ in range(size):
+            message.append(line)
+        message.toString()
+        buffered = time.perf_counter() - start
+
+        if size > baseline_max:
+            print(f"{size:>10} {buffered:>10.3f} {buffered / size * 1e6:>9.2f} {'-':>10} {'-':>9}")
+            continue
+
+        start = time.perf_counter()
+        body = ""
+        log = {}
+        for _ in range(size):
+            body = body + line + "\n"
+            log["Alice"] = body
+        concatenated = time.perf_counter() - start
+
+        print(f"{size:>10} {buffered:>10.3f} {buffered / size * 1e6:>9.2f} "
+              f"{concatenated:>10.3f} {concatenated / size * 1e6:>9.2f}")
+
+
+## Measures the append rate of a MessageJournal and the time to reopen it
+#  @param size the number of lines to append
+#  @param fsync_every the number of records between two fsyncs
+#  @param compress True to compress the records
+#
+def bench_journal(size, fsync_every, compress):
+    directory = tempfile.mkdtemp()
+    try:
+        journal = MessageJournal(directory, compress=compress, fsync_every=fsync_every)
+        start = time.perf_counter()
+        for i in range(size):
+            journal.append(f"S{i % 100}", f"R{i % 37}", "A line of text that is appended to the message body")
+        journal.commit()
+        appended = time.perf_counter() - start
+        journal.close()
+
+        start = time.perf_counter()
+        journal = MessageJournal(directory)
+        reopened = time.perf_counter() - start
+        start = time.perf_counter()
+        journal.lines("S1", "R1")
+        read = time.perf_counter() - start
+        journal.close()
+        print(f"{size:>10} {fsync_every:>12} {str(compress):>9} {size / appended:>12.0f} "
+              f"{reopened:>11.3f} {read * 1000:>10.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+## Load generator for the message bus over a Unix socket
+#  Every sender publishes lines round-robin to all recipients on its own connection, and every
+#  recipient receives on its own connection until it has all its lines.
+#  @param senders the number of senders
+#  @param recipients the number of recipients
+#  @param lines the number of lines published by every sender
+#  @param maxsize the queue size of every recipient
+#
+async def bench_bus(senders, recipients, lines, maxsize):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bus.sock")
+    server = await serve_unix(MessageBus(maxsize=maxsize), path)
+    latencies = []
+
+    async def send(sender):
+        client = await BusClient.connect(path)
+        for i in range(lines):
+            await client.publish(f"S{sender}", f"R{(sender + i) % recipients}", "A line of text")
+        await client.close()
+
+    async def receive(recipient, expected):
+        client = await BusClient.connect(path)
+        received = 0
+        while received < expected:
+            batch = await client.receive(f"R{recipient}")
+            now = time.time()
+            latencies.extend(now - sent for _, _, sent in batch)
+            received += len(batch)
+        await client.close()
+
+    # Every sender starts at its own recipient and then cycles through all of them
+    expected = [0] * recipients
+    for sender in range(senders):
+        for i in range(lines):
+            expected[(sender + i) % recipients] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[receive(r, expected[r]) for r in range(recipients)],
+                         *[send(s) for s in range(senders)])
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    shutil.rmtree(directory)
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{senders:>8} {recipients:>11} {len(latencies):>10} {len(latencies) / elapsed:>12.0f} {p99 * 1000:>10.2f}")
+
+
+## Measures full-text queries on a MessageIndex against a linear scan of the message bodies
+#  @param size the number of lines to index
+#
+def bench_index(size):
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(5000)]
+    index = MessageIndex()
+    Message.setIndex(index)
+    messages = [Message(f"S{i}", f"R{i % 7}") for i in range(100)]
+    start = time.perf_counter()
+    for i in range(size):
+        # Zipf-like word frequencies, so some words are common and most are rare
+        messages[i % 100].append(" ".join(words[int(rng.paretovariate(1)) % 5000] for _ in range(8)))
+    indexed = time.perf_counter() - start
+    Message.setIndex(None)
+
+    queries = [("all", lambda: index.search_all("word3", "word20")),
+               ("any", lambda: index.search_any("word40", "word41")),
+               ("phrase", lambda: index.search_phrase("word3 word20")),
+               ("scan", lambda: [line for m in messages for line in str(m._messageBody).split("\n")
+                                 if "word40" in line.split()])]
+    print(f"Indexed {size} lines in {indexed:.2f} s ({size / indexed:.0f} lines/sec)")
+    for name, query in queries:
+        start = time.perf_counter()
+        hits = len(query())
+        print(f"{name:>10} {hits:>10} hits {(time.perf_counter() - start) * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='P9_24_benchmark',
+                                     description="Benchmarks for the Message class.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="The numbers of lines to append to one message.")
+    parser.add_argument("--journal_lines", type=int, default=200000,
+                        help="The number of lines to append to the journal.")
+    parser.add_argument("--bus_lines", type=int, default=2000,
+                        help="The number of lines published by every sender in the bus load generator.")
+    parser.add_argument("--index_lines", type=int, default=1000000,
+                        help="The number of lines to index in the full-text search benchmark.")
+    parser.add_argument("--baseline_max", type=int, default=20000,
+                        help="The largest number of lines to run the quadratic string concatenation baseline for.")
+    args = parser.parse_args()
+
+    bench_append(args.lines, args.baseline_max)
+    print()
+    print(f"{'lines':>10} {'fsync_every':>12} {'compress':>9} {'lines/sec':>12} {'reopen s':>11} {'read ms':>10}")
+    for fsync_every, compress in [(100, False), (10000, False), (10000, True)]:
+        bench_journal(args.journal_lines, fsync_every, compress)
+    print()
+    print(f"{'senders':>8} {'recipients':>11} {'lines':>10} {'lines/sec':>12} {'p99 ms':>10}")
+    for senders, recipients in [(1, 1), (10, 10), (50, 20)]:
+        asyncio.run(bench_bus(senders, recipients, args.bus_lines, maxsize=1000))
+    print()
+    bench_index(args.index_lines)
@@ -0,0 +1,149 @@
+## An asyncio message bus that delivers the lines appended to messages to their recipients
+#  Every recipient has a bounded queue, so a publisher waits when a recipient falls behind, and
+#  recipients receive the lines in batches. The bus can be shared between processes over a Unix
+#  socket with serve_unix() and BusClient.
+#
+import asyncio, json, time
+
+
+## An in-process bus with one bounded queue per recipient
+#
+class MessageBus:
+
+    ## Constructs an empty bus
+    #  @param maxsize the maximum number of undelivered lines per recipient
+    #  @param batch_size the maximum number of lines delivered by one receive()
+    #
+    def __init__(self, maxsize=10000, batch_size=256):
+        self._maxsize = maxsize
+        self._batch_size = batch_size
+        self._queues = {}
+
+    ## Gets the queue of a recipient, creating it the first time the recipient is used
+    #  @param recipient the name of the recipient
+    #  @return the queue
+    #
+    def _queue(self, recipient):
+        queue = self._queues.get(recipient)
+        if queue is None:
+            queue = self._queues[recipient] = asyncio.Queue(self._maxsize)
+        return queue
+
+    ## Publishes a line, waiting while the queue of the recipient is full
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @param line the line of text
+    #  @param sent the time the line was sent, from time.time(), used to measure the delivery latency
+    #
+    async def publish(self, sender, recipient, line, sent=None):
+        await self._queue(recipient).put((sender, line, time.time() if sent is None else sent))
+
+    ## Publishes a line without waiting, for use from synchronous code running in the event loop thread
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @param line the line of text
+    #  @raise asyncio.QueueFull if the queue of the recipient is full
+    #
+    def publish_nowait(self, sender, recipient, line):
+        self._queue(recipient).put_nowait((sender, line, time.time()))
+
+    ## Checks that publish_nowait() can publish a line to a recipient, so a caller can check before changing its own state
+    #  @param recipient the name of the message recipient
+    #  @raise asyncio.QueueFull if the queue of the recipient is full
+    #
+    def check_room(self, recipient):
+        if self._queue(recipient).full():
+            raise asyncio.QueueFull
+
+    ## Receives the next batch of lines for a recipient, waiting until at least one line is available
+    #  @param recipient the name of the recipient
+    #  @param timeout the maximum number of seconds to wait, or None to wait until a line arrives
+    #  @return a list of at most batch_size (sender, line, sent) tuples, empty if the timeout expired
+    #
+    async def receive(self, recipient, timeout=None):
+        queue = self._queue(recipient)
+        try:
+            first = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        # Everything already in the queue is delivered with the first line, up to the batch size
+        while len(batch) < self._batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+        return batch
+
+
+## Serves a bus over a Unix socket
+#  Clients send one JSON object per line: {"op": "publish", "sender": ..., "recipient": ..., "line": ..., "sent": ...}
+#  publishes a line without a reply, and {"op": "receive", "recipient": ..., "timeout": ...} is answered
+#  with one JSON list of [sender, line, sent] batches. A publisher that sends to a full queue is not
+#  read from until the queue has room, which pushes the backpressure back to the client socket.
+#  @param bus the MessageBus to serve
+#  @param path the path of the Unix socket
+#  @return the asyncio server
+#
+async def serve_unix(bus, path):
+    async def handle(reader, writer):
+        try:
+            async for request in reader:
+                request = json.loads(request)
+                if request["op"] == "publish":
+                    await bus.publish(request["sender"], request["recipient"], request["line"], request.get("sent"))
+                elif request["op"] == "receive":
+                    batch = await bus.receive(request["recipient"], request.get("timeout"))
+                    writer.write(json.dumps(batch).encode() + b"\n")
+                    await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_unix_server(handle, path, limit=1 << 20)
+
+
+## A client of a bus served over a Unix socket
+#
+class BusClient:
+
+    ## Constructs an unconnected client, use connect() to connect it
+    #
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+
+    ## Connects to a bus
+    #  @param path the path of the Unix socket
+    #  @return the connected client
+    #
+    @classmethod
+    async def connect(cls, path):
+        client = cls()
+        client._reader, client._writer = await asyncio.open_unix_connection(path, limit=1 << 20)
+        return client
+
+    ## Publishes a line
+    #  The line is written to the socket without waiting for a reply, and drain() makes the client
+    #  wait when the server has stopped reading because the queue of the recipient is full.
+    #  @param sender the name of the message sender
+    #  @param recipient the name of the message recipient
+    #  @param line the line of text
+    #
+    async def publish(self, sender, recipient, line):
+        request = {"op": "publish", "sender": sender, "recipient": recipient, "line": line, "sent": time.time()}
+        self._writer.write(json.dumps(request).encode() + b"\n")
+        await self._writer.drain()
+
+    ## Receives the next batch of lines for a recipient
+    #  @param recipient the name of the recipient
+    #  @param timeout the maximum number of seconds to wait, or None to wait until a line arrives
+    #  @return a list of [sender, line, sent] lists, empty if the timeout expired
+    #
+    async def receive(self, recipient, timeout=None):
+        request = {"op": "receive", "recipient": recipient, "timeout": timeout}
+        self._writer.write(json.dumps(request).encode() + b"\n")
+        await self._writer.drain()
+        return json.loads(await self._reader.readline())
+
+    ## Closes the connection
+    #
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
@@ -1,29 +1,254 @@
 
+import array, collections, json, os, struct, threading
+
+
+## An event sink that prints a message for every purchase, like makePurchase always did
+#
+class PrintSink:
+
+    ## Records an event
+    #  @param kind "purchase", "discount_applied" or "discount_earned"
+    #  @param customerId the id of the customer
+    #  @param amount the initial purchase amount
+    #  @param paid the amount paid after the discount
+    #
+    def record(self, kind, customerId, amount, paid):
+        if kind == "discount_applied":
+            print(f"You made a purchase of ${amount} but with a $10 discount you only paid ${paid}!")
+        elif kind == "purchase":
+            print(f"Thank you for making a purchase of ${amount}.")
+
+
+## An event sink that keeps the latest events in memory
+#
+class RingBufferSink:
+
+    ## Constructs an empty buffer
+    #  @param capacity the maximum number of events kept, older events are dropped
+    #
+    def __init__(self, capacity=10000):
+        self._events = collections.deque(maxlen=capacity)
+
+    ## Records an event, see PrintSink.record
+    #
+    def record(self, kind, customerId, amount, paid):
+        self._events.append((kind, customerId, amount, paid))
+
+    ## Gets the events in the buffer
+    #  @return a list of event dictionaries, oldest first
+    #
+    def events(self):
+        return [{"event": kind, "customer": customerId, "amount": amount, "paid": paid}
+                for kind, customerId, amount, paid in self._events]
+
+
+## An event sink that writes one JSON object per event to a file, in batches
+#  Events are buffered and written with one write call per batch_size events. Use it as a context
+#  manager, or call close(), so the last batch is written. The sink has a lock, so it can be shared
+#  by the threads of a CustomerRegistry.
+#
+class JsonlSink:
+
+    ## Opens the file to append the events to
+    #  @param file_name the name of the file
+    #  @param batch_size the number of events per write
+    #
+    def __init__(self, file_name, batch_size=1000):
+        self._file = open(file_name, "a")
+        self._batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    ## Records an event, see PrintSink.record
+    #
+    def record(self, kind, customerId, amount, paid):
+        line = json.dumps({"event": kind, "customer": customerId, "amount": amount, "paid": paid})
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self._batch_size:
+                self._flush()
+
+    ## Writes the buffered events to the file
+    #  The caller must hold the lock.
+    #
+    def _flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+        self._file.flush()
+
+    ## Writes the buffered events to the file
+    #
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    ## Writes the buffered events and closes the file
+    #
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+## A tier of a LoyaltyRules rule set
+#  A customer earns the discount of the tier when their accumulated purchases reach the threshold.
+#
+class DiscountTier:
+
+    ## Constructs a tier with either a fixed or a percentage discount
+    #  @param threshold the accumulated purchases needed to earn the discount
+    #  @param amount the fixed discount in dollars, the paid amount is never below 0
+    #  @param percent the discount in percent of the purchase amount
+    #  @param minPurchase the smallest purchase the discount can be used on, smaller purchases keep the discount
+    #
+    def __init__(self, threshold, amount=None, percent=None, minPurchase=0):
+        if (amount is None) == (percent is None):
+            raise ValueError("A discount tier needs either an amount or a percent.")
+        self.threshold = threshold
+        self.amount = amount
+        self.percent = percent
+        self.minPurchase = minPurchase
+
+
+## A declarative loyalty rule set generalising the hard-coded $10-off-after-$100 rule of Customer
+#  When the accumulated purchases reach the threshold of one or more tiers, the customer earns the
+#  discount of the highest of those tiers, the accumulated purchases are reset to 0, and the discount
+#  is used on the next purchase of at least the tier's minPurchase. An earned discount replaces a
+#  discount that has not been used yet, and with expiresAfter it is lost after that many purchases
+#  it could not be used on.
+#
+#  The rules are compiled once into a Python function with one branch per tier, so a purchase does
+#  not loop over the tiers or look up their attributes.
+#
+class LoyaltyRules:
+
+    ## Constructs a rule set
+    #  @param tiers a list of DiscountTier objects
+    #  @param expiresAfter the number of purchases an unused discount is kept for, or None to keep it until used
+    #
+    def __init__(self, tiers, expiresAfter=None):
+        if not tiers:
+            raise ValueError("A rule set needs at least one tier.")
+        self._tiers = sorted(tiers, key=lambda tier: tier.threshold)
+        self._expiresAfter = expiresAfter
+        self.evaluate = self._compile()
+
+    ## Constructs the rule set that Customer uses without rules: $10 off the next purchase after $100
+    #  @return the rule set
+    #
+    @classmethod
+    def default(cls):
+        return cls([DiscountTier(100, amount=10)])
+
+    ## Generates and compiles the evaluation function of the rules
+    #  The function is evaluate(accum, pending, left, amount) where pending is the number of the tier
+    #  whose discount has been earned, from 1 and up, or 0, and left is the number of purchases it
+    #  is kept for. It returns (paid, accum, pending, left, applied, earned), where applied and earned
+    #  are the numbers of the tiers whose discount was used and earned on this purchase, or 0.
+    #  The values of the tiers are bound as keyword-only default arguments of the function, so they
+    #  can be of any type, e.g. Decimal, and are read as fast local variables.
+    #  @return the function
+    #
+    def _compile(self):
+        values = {"expiresAfter": self._expiresAfter}
+        lines = ["    applied = 0",
+                 "    paid = amount",
+                 "    if pending:"]
+        keyword = "if"
+        for number, tier in enumerate(self._tiers, 1):
+            values[f"threshold{number}"] = tier.threshold
+            values[f"minPurchase{number}"] = tier.minPurchase
+            if tier.amount is not None:
+                values[f"amount{number}"] = tier.amount
+                discounted = f"max(amount - amount{number}, 0)"
+            else:
+                # The percent is used as given, so the result has the type of the amount, e.g. Decimal
+                values[f"percent{number}"] = tier.percent
+                discounted = f"amount - amount * percent{number} / 100"
+            lines += [f"        {keyword} pending == {number} and amount >= minPurchase{number}:",
+                      f"            paid = {discounted}",
+                      f"            applied = {number}",
+                      f"            pending = 0"]
+            keyword = "elif"
+        if self._expiresAfter is not None:
+            lines += ["        else:",
+                      "            left -= 1",
+                      "            if left <= 0:",
+                      "                pending = 0"]
+        # Most purchases stay below the lowest threshold, which is tested before the tiers so they
+        # take the same time however many tiers there are. The highest tier is tested first, so the
+        # customer gets the best discount they have reached.
+        lines += ["    accum += paid",
+                  "    earned = 0",
+                  "    if accum >= threshold1:"]
+        keyword = "if"
+        for number in range(len(self._tiers), 0, -1):
+            lines += [f"        {keyword} accum >= threshold{number}:",
+                      f"            earned = {number}"]
+            keyword = "elif"
+        lines += ["        pending = earned",
+                  "        left = expiresAfter",
+                  "        accum = 0",
+                  "    return paid, accum, pending, left, applied, earned"]
+
+        defaults = ", ".join(f"{name}={name}" for name in values)
+        lines.insert(0, f"def evaluate(accum, pending, left, amount, *, {defaults}):")
+        # The defaults are evaluated from the namespace when the function is defined
+        namespace = dict(values)
+        exec(compile("\n".join(lines), "<LoyaltyRules>", "exec"), namespace)
+        return namespace["evaluate"]
+
+
 ## Defines a Customer class to handle a customer loyalty marketing campaign
 #  A customer receiver a $10 discount on their next purchase when they have 
 #  made accumulated purchases of at least $100.
 #
 class Customer:
+    ## The sink used when no sink is given, which prints a message for every purchase
+    _defaultSink = PrintSink()
+
     ## Constructs a costumer with accumulated purchases of zero and no earned discount
+    #  @param sink the sink that records the purchase, discount-applied and discount-earned events,
+    #      None to record nothing, or by default a PrintSink that prints a message for every purchase
+    #  @param customerId an id of the customer that is passed on with every event
+    #  @param rules a LoyaltyRules rule set to use instead of the $10 discount after $100 of purchases
     #
-    def __init__(self):
+    def __init__(self, sink=_defaultSink, customerId=None, rules=None):
         self._accumPurchases = 0
         self._discountOnNextPurchase = False
+        self._sink = sink
+        self._customerId = customerId
+        self._rules = rules
+        self._discountLeft = None
 
     ## Makes a purchase
     #  @param amount the initial purchase amount
     #
     def makePurchase(self, amount):
+        if self._rules is not None:
+            self._makeRulePurchase(amount)
+            return
+
         # If the customer has earned a discount he/she will use it on this purchase
         # and the accumulated purchases will only increase with the maximum of amount - 10 and 0
+        sink = self._sink
         if self._discountOnNextPurchase: 
             effPurchaseAmount = max(amount - 10, 0)
             self._discountOnNextPurchase = False
-            print(f"You made a purchase of ${amount} but with a $10 discount you only paid ${effPurchaseAmount}!")
+            if sink is not None:
+                sink.record("discount_applied", self._customerId, amount, effPurchaseAmount)
         # Otherwise, the self.accumPurchases will increase with the full amount
         else: 
             effPurchaseAmount = amount
-            print(f"Thank you for making a purchase of ${amount}.")
+            if sink is not None:
+                sink.record("purchase", self._customerId, amount, effPurchaseAmount)
         
         self._accumPurchases += effPurchaseAmount
 
@@ -31,15 +256,306 @@ class Customer:
         if self._accumPurchases >= 100:
             self._discountOnNextPurchase = True
             self._accumPurchases = 0
+            if sink is not None:
+                sink.record("discount_earned", self._customerId, amount, effPurchaseAmount)
     
+    ## Makes a purchase with the compiled rule set of the customer
+    #  With rules, _discountOnNextPurchase holds the number of the earned tier, or 0.
+    #  @param amount the initial purchase amount
+    #
+    def _makeRulePurchase(self, amount):
+        paid, self._accumPurchases, self._discountOnNextPurchase, self._discountLeft, applied, earned = \
+            self._rules.evaluate(self._accumPurchases, self._discountOnNextPurchase, self._discountLeft, amount)
+        if self._sink is not None:
+            self._sink.record("discount_applied" if applied else "purchase", self._customerId, amount, paid)
+            if earned:
+                self._sink.record("discount_earned", self._customerId, amount, paid)
+
     ## Check if customer is eligible for a discount on the next purchase
     #  @return the boolean value of whether the customer will receive discount on the next purchase
     #
     def discountReached(self):
-        return self._discountOnNextPurchase
+        return bool(self._discountOnNextPurchase)
         
 
 
+## Replays many purchases of many customers at once with the same rule as Customer.makePurchase
+#  The events are processed in one pass that keeps the state of every customer in a dictionary,
+#  without creating a Customer object or printing anything per purchase. The results are the same as
+#  calling makePurchase on one Customer per customer id in the order of the events.
+#  @param customer_ids the customer id of every purchase
+#  @param amounts the amount of every purchase
+#  @param state an optional dictionary from customer id to (accumulated purchases, discount on next purchase)
+#      to continue from, which is updated with the state after the purchases
+#  @param rules an optional LoyaltyRules rule set to replay instead of the hard-coded rule, in which case
+#      the state is (accumulated purchases, earned tier, purchases left) and the discount flags are tier numbers
+#  @return a dictionary with a list per purchase of the "effective" amount paid, the "accumulated"
+#      purchases after the purchase, whether the purchase "used_discount" and whether it "earned_discount",
+#      together with the final "state" dictionary
+#
+def simulatePurchases(customer_ids, amounts, state=None, rules=None):
+    if state is None:
+        state = {}
+    effective = []
+    accumulated = []
+    used_discount = []
+    earned_discount = []
+
+    if rules is not None:
+        evaluate = rules.evaluate
+        for customer_id, amount in zip(customer_ids, amounts):
+            accum, pending, left = state.get(customer_id, (0, 0, None))
+            paid, accum, pending, left, applied, earned = evaluate(accum, pending, left, amount)
+            state[customer_id] = (accum, pending, left)
+
+            effective.append(paid)
+            accumulated.append(accum)
+            used_discount.append(applied)
+            earned_discount.append(earned)
+        return {
+            "effective": effective,
+            "accumulated": accumulated,
+            "used_discount": used_discount,
+            "earned_discount": earned_discount,
+            "state": state,
+        }
+
+    for customer_id, amount in zip(customer_ids, amounts):
+        accum, discount = state.get(customer_id, (0, False))
+        eff_amount = max(amount - 10, 0) if discount else amount
+        accum += eff_amount
+        earned = accum >= 100
+        if earned:
+            accum = 0
+        state[customer_id] = (accum, earned)
+
+        effective.append(eff_amount)
+        accumulated.append(accum)
+        used_discount.append(discount)
+        earned_discount.append(earned)
+
+    return {
+        "effective": effective,
+        "accumulated": accumulated,
+        "used_discount": used_discount,
+        "earned_discount": earned_discount,
+        "state": state,
+    }
+
+
+## A registry of many customers stored in arrays and split into shards with one lock each
+#  Customers are identified by integer ids from 0 and up. Customer id i is stored in shard
+#  i % shards at position i // shards, and every shard keeps the accumulated purchases in an
+#  array of doubles and the earned discounts in a bytearray, which is about 9 bytes per customer.
+#  Purchases of customers in different shards can be applied in parallel by several threads.
+#
+class CustomerRegistry:
+    _HEADER = struct.Struct("<4sII")
+    _SHARD = struct.Struct("<Q")
+
+    ## Constructs an empty registry
+    #  @param shards the number of shards
+    #  @param sink the sink that records the purchase events, see Customer, or None to record nothing
+    #
+    def __init__(self, shards=64, sink=None):
+        self._shards = [_CustomerShard() for _ in range(shards)]
+        self._sink = sink
+        self._snapshotStop = None
+        self._snapshotLock = threading.Lock()
+
+    ## Checks that a customer id can be stored in the registry
+    #  @param customerId the id of the customer
+    #  @raise ValueError if the id is negative, which would address another customer of its shard
+    #
+    @staticmethod
+    def _check(customerId):
+        if customerId < 0:
+            raise ValueError(f"Customer ids start from 0, got {customerId}.")
+
+    ## Grows a shard with zeroed customers until it has a customer at the given position
+    #  The caller must hold the lock of the shard.
+    #  @param shard the shard of the customer
+    #  @param position the position of the customer in the shard
+    #
+    @staticmethod
+    def _grow(shard, position):
+        missing = position + 1 - len(shard.accum)
+        if missing > 0:
+            # Zero bytes are 0.0 as doubles
+            shard.accum.frombytes(bytes(8 * missing))
+            shard.discount.extend(bytes(missing))
+
+    ## Applies a purchase to a customer in a shard with the same rule as Customer.makePurchase
+    #  The caller must hold the lock of the shard.
+    #  @param shard the shard of the customer
+    #  @param customerId the id of the customer
+    #  @param amount the initial purchase amount
+    #  @return the amount paid
+    #
+    def _apply(self, shard, customerId, amount):
+        position = customerId // len(self._shards)
+        self._grow(shard, position)
+        if shard.discount[position]:
+            effPurchaseAmount = max(amount - 10, 0)
+            shard.discount[position] = 0
+            if self._sink is not None:
+                self._sink.record("discount_applied", customerId, amount, effPurchaseAmount)
+        else:
+            effPurchaseAmount = amount
+            if self._sink is not None:
+                self._sink.record("purchase", customerId, amount, effPurchaseAmount)
+
+        accum = shard.accum[position] + effPurchaseAmount
+        if accum >= 100:
+            shard.discount[position] = 1
+            accum = 0
+            if self._sink is not None:
+                self._sink.record("discount_earned", customerId, amount, effPurchaseAmount)
+        shard.accum[position] = accum
+        return effPurchaseAmount
+
+    ## Makes a purchase for a customer
+    #  @param customerId the id of the customer, an integer from 0 and up
+    #  @param amount the initial purchase amount
+    #  @return the amount paid after any discount
+    #  @raise ValueError if the customer id is negative
+    #
+    def makePurchase(self, customerId, amount):
+        self._check(customerId)
+        shard = self._shards[customerId % len(self._shards)]
+        with shard.lock:
+            return self._apply(shard, customerId, amount)
+
+    ## Makes many purchases, taking the lock of every shard once
+    #  The purchases of one customer are applied in the order they are given.
+    #  @param customerIds the customer id of every purchase
+    #  @param amounts the amount of every purchase
+    #  @raise ValueError if a customer id is negative, before any purchase is applied
+    #
+    def makePurchases(self, customerIds, amounts):
+        byShard = collections.defaultdict(list)
+        for customerId, amount in zip(customerIds, amounts):
+            self._check(customerId)
+            byShard[customerId % len(self._shards)].append((customerId, amount))
+        for index, purchases in byShard.items():
+            shard = self._shards[index]
+            with shard.lock:
+                for customerId, amount in purchases:
+                    self._apply(shard, customerId, amount)
+
+    ## Gets the state of a customer
+    #  @param customerId the id of the customer
+    #  @return the accumulated purchases and whether the customer has a discount on the next purchase
+    #
+    def _state(self, customerId):
+        self._check(customerId)
+        shard = self._shards[customerId % len(self._shards)]
+        position = customerId // len(self._shards)
+        with shard.lock:
+            if position >= len(shard.accum):
+                return 0.0, False
+            return shard.accum[position], bool(shard.discount[position])
+
+    ## Check if a customer is eligible for a discount on the next purchase
+    #  @param customerId the id of the customer
+    #  @return the boolean value of whether the customer will receive discount on the next purchase
+    #
+    def discountReached(self, customerId):
+        return self._state(customerId)[1]
+
+    ## Gets the accumulated purchases of a customer since the last earned discount
+    #  @param customerId the id of the customer
+    #  @return the accumulated purchases
+    #
+    def accumPurchases(self, customerId):
+        return self._state(customerId)[0]
+
+    ## Writes the registry to a file
+    #  Every shard is copied under its lock and the file is written to a temporary file that then
+    #  replaces file_name, so a crash during the snapshot leaves the previous snapshot intact.
+    #  Snapshots of one registry are serialised by a lock, and the temporary file is named after
+    #  the process and the registry, so concurrent snapshots never write the same temporary file.
+    #  @param file_name the name of the file
+    #
+    def snapshot(self, file_name):
+        with self._snapshotLock:
+            self._snapshot(file_name)
+
+    ## Writes the registry to a file, see snapshot()
+    #  The caller must hold the snapshot lock.
+    #  @param file_name the name of the file
+    #
+    def _snapshot(self, file_name):
+        temp_name = f"{file_name}.{os.getpid()}.{id(self)}.tmp"
+        try:
+            with open(temp_name, "wb") as file:
+                file.write(self._HEADER.pack(b"CREG", 1, len(self._shards)))
+                for shard in self._shards:
+                    with shard.lock:
+                        accum = shard.accum.tobytes()
+                        discount = bytes(shard.discount)
+                    file.write(self._SHARD.pack(len(discount)))
+                    file.write(accum)
+                    file.write(discount)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_name, file_name)
+        except BaseException:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+
+    ## Reads a registry written by snapshot()
+    #  @param file_name the name of the file
+    #  @param sink the sink of the new registry, see the constructor
+    #  @return the registry
+    #
+    @classmethod
+    def load(cls, file_name, sink=None):
+        with open(file_name, "rb") as file:
+            magic, version, shards = cls._HEADER.unpack(file.read(cls._HEADER.size))
+            if magic != b"CREG" or version != 1:
+                raise ValueError(f"{file_name} is not a customer registry snapshot.")
+            registry = cls(shards, sink)
+            for shard in registry._shards:
+                (count,) = cls._SHARD.unpack(file.read(cls._SHARD.size))
+                shard.accum.frombytes(file.read(8 * count))
+                shard.discount.extend(file.read(count))
+        return registry
+
+    ## Starts a background thread that writes a snapshot every interval seconds
+    #  @param file_name the name of the snapshot file
+    #  @param interval the number of seconds between two snapshots
+    #
+    def startSnapshots(self, file_name, interval):
+        self.stopSnapshots()
+        stop = self._snapshotStop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.snapshot(file_name)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    ## Stops the periodic snapshots started by startSnapshots()
+    #
+    def stopSnapshots(self):
+        if self._snapshotStop is not None:
+            self._snapshotStop.set()
+            self._snapshotStop = None
+
+
+## One shard of a CustomerRegistry
+#
+class _CustomerShard:
+    __slots__ = ("lock", "accum", "discount")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.accum = array.array("d")
+        self.discount = bytearray()
+
+
 ## Test program, only executed if this file is executed directly
 #
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import argparse, contextlib, io, itertools, os, random, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from P9_26 import (Customer, CustomerRegistry, DiscountTier, JsonlSink, LoyaltyRules, RingBufferSink,
+                   simulatePurchases)
+
+
+## Benchmarks for the Customer class
+#  Run with e.g. "python P9_26_benchmark.py --events 1000000" from this folder.
+#
+
+
+## Generates random purchases
+#  @param events the number of purchases
+#  @param customers the number of customers
+#  @return the customer ids and amounts of the purchases
+#
+def random_purchases(events, customers):
+    rng = random.Random(0)
+    customer_ids = [rng.randrange(customers) for _ in range(events)]
+    amounts = [rng.randint(1, 80) for _ in range(events)]
+    return customer_ids, amounts
+
+
+## Compares simulatePurchases with one Customer per customer id and a makePurchase call per purchase
+#  The output of makePurchase is discarded, so the comparison includes the cost of formatting it but not of a terminal.
+#  @param events the number of purchases
+#  @param customers the number of customers
+#
+def bench_simulate(events, customers):
+    customer_ids, amounts = random_purchases(events, customers)
+
+    start = time.perf_counter()
+    simulatePurchases(customer_ids, amounts)
+    batch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    objects = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for customer_id, amount in zip(customer_ids, amounts):
+            if customer_id not in objects:
+                objects[customer_id] = Customer()
+            objects[customer_id].makePurchase(amount)
+    scalar = time.perf_counter() - start
+
+    print(f"{'events':>10} {'batch events/s':>15} {'makePurchase events/s':>22}")
+    print(f"{events:>10} {events / batch:>15.0f} {events / scalar:>22.0f}")
+
+
+## Measures makePurchase calls per second for every kind of event sink
+#  The printed messages go to a discarded in-memory buffer, so they are measured without a terminal.
+#  @param events the number of purchases
+#
+def bench_sinks(events):
+    _, amounts = random_purchases(events, 1)
+    file_name = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+    jsonl = JsonlSink(file_name)
+    sinks = [("print", Customer._defaultSink), ("none", None), ("ring buffer", RingBufferSink()), ("jsonl", jsonl)]
+
+    print(f"{'sink':>12} {'calls/s':>12}")
+    for name, sink in sinks:
+        customer = Customer(sink, customerId=1)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for amount in amounts:
+                customer.makePurchase(amount)
+        print(f"{name:>12} {events / (time.perf_counter() - start):>12.0f}")
+    jsonl.close()
+    os.remove(file_name)
+    os.rmdir(os.path.dirname(file_name))
+
+
+## Measures purchases per second of a CustomerRegistry for a growing number of threads
+#  The purchases are split into batches that a thread pool applies with makePurchases, and the
+#  snapshot time of the final registry is reported as well.
+#  @param events the number of purchases
+#  @param customers the number of customers
+#  @param thread_counts the numbers of threads to benchmark
+#
+def bench_registry(events, customers, thread_counts):
+    customer_ids, amounts = random_purchases(events, customers)
+    batch = 10000
+    batches = [(customer_ids[i:i + batch], amounts[i:i + batch]) for i in range(0, events, batch)]
+
+    print(f"{'threads':>8} {'purchases/s':>12}")
+    for threads in thread_counts:
+        registry = CustomerRegistry()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda purchases: registry.makePurchases(*purchases), batches))
+        print(f"{threads:>8} {events / (time.perf_counter() - start):>12.0f}")
+
+    file_name = os.path.join(tempfile.mkdtemp(), "registry.bin")
+    start = time.perf_counter()
+    registry.snapshot(file_name)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    CustomerRegistry.load(file_name)
+    loaded = time.perf_counter() - start
+    print(f"Snapshot of {customers} customers: {os.path.getsize(file_name)} bytes, "
+          f"written in {written * 1000:.1f} ms, loaded in {loaded * 1000:.1f} ms")
+    os.remove(file_name)
+    os.rmdir(os.path.dirname(file_name))
+
+
+## Compares the hard-coded rule of makePurchase with compiled LoyaltyRules of a growing number of tiers
+#  @param events the number of purchases
+#
+def bench_rules(events):
+    _, amounts = random_purchases(events, 1)
+    rule_sets = [("hard-coded", None), ("default rules", LoyaltyRules.default())]
+    for tiers in (3, 10):
+        rule_sets.append((f"{tiers} tiers", LoyaltyRules(
+            [DiscountTier(100 * t, percent=t) for t in range(1, tiers + 1)], expiresAfter=5)))
+
+    print(f"{'rules':>14} {'makePurchase/s':>15} {'simulate/s':>12}")
+    for name, rules in rule_sets:
+        customer = Customer(None, rules=rules)
+        start = time.perf_counter()
+        for amount in amounts:
+            customer.makePurchase(amount)
+        scalar = time.perf_counter() - start
+        start = time.perf_counter()
+        simulatePurchases(itertools.repeat(0), amounts, rules=rules)
+        batch = time.perf_counter() - start
+        print(f"{name:>14} {events / scalar:>15.0f} {events / batch:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='P9_26_benchmark',
+                                     description="Benchmarks for the Customer class.")
+    parser.add_argument("--events", type=int, default=1000000,
+                        help="The number of purchases to replay.")
+    parser.add_argument("--customers", type=int, default=10000,
+                        help="The number of customers.")
+    args = parser.parse_args()
+
+    bench_simulate(args.events, args.customers)
+    print()
+    bench_sinks(args.events)
+    print()
+    bench_registry(args.events, args.customers, [1, 2, 4, 8])
+    print()
+    bench_rules(args.events)
@@ -0,0 +1,109 @@
+## Tests of the crash recovery of MessageJournal
+#  Run with "python -m pytest" or "python -m unittest" from this folder.
+#
+import asyncio, os, shutil, subprocess, sys, tempfile, unittest
+from P9_24 import Message, MessageJournal
+from P9_24_bus import MessageBus
+
+
+class MessageJournalReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = os.path.join(self.directory, "journal.dat")
+        self.index = os.path.join(self.directory, "journal.idx")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    ## Appends three lines and closes the journal
+    #  @return the size of journal.dat after each line
+    #
+    def write_three(self):
+        journal = MessageJournal(self.directory)
+        sizes = []
+        for line in ("first", "second", "third"):
+            journal.append("Bob", "Alice", line)
+            journal.commit()
+            sizes.append(os.path.getsize(self.data))
+        journal.close()
+        return sizes
+
+    ## Reopens the journal, checks the lines and that appending and reading still work
+    #  @param expected the lines expected after the replay
+    #
+    def check_reopen(self, expected):
+        journal = MessageJournal(self.directory)
+        self.assertEqual(journal.lines("Bob", "Alice"), expected)
+        journal.append("Bob", "Alice", "fourth")
+        self.assertEqual(journal.lines("Bob", "Alice"), expected + ["fourth"])
+        journal.close()
+        journal = MessageJournal(self.directory)
+        self.assertEqual(journal.lines("Bob", "Alice"), expected + ["fourth"])
+        journal.close()
+
+    def test_truncated_payload(self):
+        sizes = self.write_three()
+        os.truncate(self.data, sizes[2] - 2)
+        self.check_reopen(["first", "second"])
+
+    def test_truncated_header(self):
+        sizes = self.write_three()
+        os.truncate(self.data, sizes[1] + 3)
+        self.check_reopen(["first", "second"])
+
+    def test_data_file_truncated_to_last_complete_record(self):
+        sizes = self.write_three()
+        os.truncate(self.data, sizes[2] - 2)
+        MessageJournal(self.directory).close()
+        self.assertEqual(os.path.getsize(self.data), sizes[1])
+        self.assertEqual(os.path.getsize(self.index), 2 * MessageJournal._INDEX.size)
+
+    def test_records_missing_from_the_index(self):
+        self.write_three()
+        os.truncate(self.index, MessageJournal._INDEX.size)
+        self.check_reopen(["first", "second", "third"])
+
+    def test_buffered_records_written_at_exit(self):
+        script = ("import sys; from P9_24 import MessageJournal; "
+                  "MessageJournal(sys.argv[1]).append('Bob', 'Alice', 'first')")
+        subprocess.run([sys.executable, "-c", script, self.directory], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.check_reopen(["first"])
+
+
+class MessageBusAppendTest(unittest.TestCase):
+
+    def tearDown(self):
+        Message.setBus(None)
+
+    def test_append_to_full_queue_changes_nothing(self):
+        async def run():
+            Message.setBus(MessageBus(maxsize=1))
+            message = Message("Carol", "Dave")
+            message.append("first")
+            with self.assertRaises(asyncio.QueueFull):
+                message.append("second")
+            self.assertEqual(str(Message._log["Carol"]["Dave"]), "first\n")
+
+        asyncio.run(run())
+
+    def test_append_async_waits_for_room(self):
+        async def run():
+            bus = MessageBus(maxsize=1)
+            Message.setBus(bus)
+            message = Message("Erin", "Frank")
+            message.append("first")
+            waiting = asyncio.ensure_future(message.appendAsync("second"))
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            self.assertEqual(str(Message._log["Erin"]["Frank"]), "first\n")
+            self.assertEqual([line for _, line, _ in await bus.receive("Frank")], ["first"])
+            await waiting
+            self.assertEqual(str(Message._log["Erin"]["Frank"]), "first\nsecond\n")
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
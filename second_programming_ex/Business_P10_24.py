@@ -1,22 +1,51 @@
+import array
+import calendar
 import datetime as dt
+import functools
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+# The month names indexed by the month, computed once instead of with strftime on every render
+_MONTH_NAMES = ("",) + tuple(dt.date(1900, month, 1).strftime('%B') for month in range(1, 13))
+
 
 class Appointment:
     """
     A class used to represent a generic Appointment.
+
+    The appointment classes declare their attributes in __slots__ and store the creation time and
+    dates as integers, so an appointment has no per-instance dictionary. Descriptions are interned,
+    so appointments with the same description share one string. The string representation is
+    rendered by the subclasses once and cached until the timestamp changes.
     
     Attributes
     ----------
     _description : str
         A description for the appointment.
+    _created : int
+        The POSIX time in seconds when the appointment was created.
     _timestamp : datetime
-        The date and time when the appointment was created, ignoring microseconds.
+        The date and time when the appointment was created, ignoring microseconds, computed from _created.
     _type : str
-        The type of the appointment, defaulting to "Generic".
+        The type of the appointment, a class attribute defaulting to "Generic".
     _strspecified_time : str or None
-        A string representing the specified time for the appointment, defaulting to None.
+        A string representing the specified time for the appointment, defaulting to None, computed when read.
+    _repr : str or None
+        The cached string representation, None until the appointment is first rendered.
 
     Methods
     -------
+    __repr__()
+        Return the cached string representation, rendering it with _render the first time.
+    _render()
+        Compute the string representation, overridden by the subclasses.
     occursOn(year, month, day)
         Abstract method to check if the appointment occurs on a given date.
     getDescription()
@@ -25,9 +54,15 @@ class Appointment:
         Return the creation timestamp of the appointment.
     save(file_name)
         Save the appointment to a file.
+    toLine()
+        Return the line that save writes for the appointment.
+    toRecord()
+        Return the appointment as a dictionary for the JSON lines format.
     load(text_line)
         Load the appointment details from a text line.
     """
+    __slots__ = ("_description", "_created", "_repr")
+    _type = "Generic"
 
     def __init__(self, description):
         """
@@ -36,10 +71,46 @@ class Appointment:
         description : str
             The description of the appointment.
         """
-        self._description = description
-        self._timestamp = dt.datetime.now().replace(microsecond=0)
-        self._type = "Generic"
-        self._strspecified_time = None
+        self._description = sys.intern(description) if type(description) is str else description
+        self._created = int(time.time())
+        self._repr = None
+
+    @property
+    def _timestamp(self):
+        """
+        The creation timestamp as a local datetime.
+
+        """
+        return dt.datetime.fromtimestamp(self._created)
+
+    @_timestamp.setter
+    def _timestamp(self, timestamp):
+        self._created = int(timestamp.timestamp())
+        self._repr = None
+
+    @property
+    def _strspecified_time(self):
+        """
+        The specified time of the appointment, None for a generic appointment.
+
+        """
+        return None
+
+    def __repr__(self):
+        """
+        Return the string representation of the appointment, rendered once and then cached.
+
+        """
+        if self._repr is None:
+            self._repr = self._render()
+        return self._repr
+
+    def _render(self):
+        """
+        Compute the string representation of the appointment, overridden by the subclasses.
+
+        """
+        return object.__repr__(self)
     
     def occursOn(self, day, month, year):
         """
@@ -98,14 +169,29 @@ class Appointment:
         Each appointment entry is written on a new line.
         """
         with open(file_name, "a+") as file:
-            if self._strspecified_time:
-                file.write(f"{self._timestamp} | {self._type} appointment: '{self.getDescription()}' at " + self._strspecified_time + "\n")
-            else:
-                file.write(f"{self._timestamp} | {self._type} appointment: '{self.getDescription()}'\n")
+            file.write(self.toLine())
+
+    def toLine(self):
+        """
+        Return the line that save writes for the appointment, including the newline.
+
+        """
+        if self._strspecified_time:
+            return f"{self._timestamp} | {self._type} appointment: '{self.getDescription()}' at " + self._strspecified_time + "\n"
+        return f"{self._timestamp} | {self._type} appointment: '{self.getDescription()}'\n"
+
+    def toRecord(self):
+        """
+        Return the appointment as a dictionary, used by save_many for the JSON lines format.
+
+        Subclasses add the fields that specify when they occur.
+        """
+        return {"timestamp": self._timestamp.isoformat(), "type": self._type, "description": self._description}
         
     def load(self, text_line):
         """
-        This method sets the object's timestamp attribute to the timestamp found in the text_line.
+        This method sets the object's timestamp attribute to the timestamp found in the text_line,
+        which invalidates the cached string representation.
 
         Parameters
         ----------
@@ -123,12 +209,14 @@ class OneTime(Appointment):
 
     Attributes
     ----------
+    _date : int
+        The date of the appointment encoded as year * 10000 + month * 100 + day.
     _day : int
-        The day of the month on which the one-time appointment occurs.
+        The day of the month on which the one-time appointment occurs, decoded from _date.
     _month : int
-        The month of the year on which the one-time appointment occurs.
+        The month of the year on which the one-time appointment occurs, decoded from _date.
     _year : int
-        The year on which the one-time appointment occurs.
+        The year on which the one-time appointment occurs, decoded from _date.
     _type : str
         The type of appointment, which is "One time".
     _strspecified_time : str or None
@@ -136,11 +224,15 @@ class OneTime(Appointment):
 
     Methods
     -------
-    __repr__()
-        An override of the built-in function for returning a string representation of an object.
+    _render()
+        Compute the string representation of the appointment, cached by Appointment.__repr__.
     occursOn(day, month, year)
         Check if the one-time appointment occurs on the specified date.
+    toRecord()
+        Return the appointment as a dictionary including its date.
     """
+    __slots__ = ("_date",)
+    _type = "One time"
 
     def __init__(self, description, day, month, year):
         """
@@ -156,13 +248,25 @@ class OneTime(Appointment):
             The year for the appointment.
         """
         super().__init__(description)
-        self._day = day
-        self._month = month
-        self._year = year
-        self._type = "One time"
-        self._strspecified_time = f"{self._year}-{self._month}-{self._day}"
+        self._date = year * 10000 + month * 100 + day
+
+    @property
+    def _day(self):
+        return self._date % 100
+
+    @property
+    def _month(self):
+        return self._date // 100 % 100
+
+    @property
+    def _year(self):
+        return self._date // 10000
+
+    @property
+    def _strspecified_time(self):
+        return f"{self._year}-{self._month}-{self._day}"
     
-    def __repr__(self):
+    def _render(self):
         """
         Compute the "official" string representation of the OneTime appointment object.
 
@@ -171,8 +275,7 @@ class OneTime(Appointment):
         repr : str
             The string representation of the one-time appointment with the date and description.
         """
-        strmonth = dt.date(1900, self._month, 1).strftime('%B')  # To get the string representation of the month
-        return f"One time appointment {self._day} {strmonth} {self._year} '{super().getDescription()}'"
+        return f"One time appointment {self._day} {_MONTH_NAMES[self._month]} {self._year} '{self._description}'"
     
     def occursOn(self, day, month, year):
         """
@@ -192,7 +295,16 @@ class OneTime(Appointment):
         occurs : bool
             True if the appointment occurs on the given date, False otherwise.
         """
-        return self._year == year and self._month == month and self._day == day
+        return self._date == year * 10000 + month * 100 + day
+
+    def toRecord(self):
+        """
+        Return the appointment as a dictionary including its date.
+
+        """
+        record = super().toRecord()
+        record.update(day=self._day, month=self._month, year=self._year)
+        return record
         
 
 class Daily(Appointment):
@@ -206,11 +318,13 @@ class Daily(Appointment):
 
     Methods
     -------
-    __repr__()
-        An override of the built-in function for returning a string representation of an object.
+    _render()
+        Compute the string representation of the appointment, cached by Appointment.__repr__.
     occursOn(day, month, year)
         Check if the daily appointment occurs on the specified date (always true for daily appointments).
     """
+    __slots__ = ()
+    _type = "Daily"
 
     def __init__(self, description):
         """
@@ -222,10 +336,8 @@ class Daily(Appointment):
             The description of the daily appointment.
         """
         super().__init__(description)
-        self._type = "Daily"
-        
     
-    def __repr__(self):
+    def _render(self):
         """
         Compute the "official" string representation of the Daily appointment object.
 
@@ -234,10 +346,8 @@ class Daily(Appointment):
         repr : str
             The string representation of the daily appointment with the start date and description.
         """
-        day      = super().getTimeStamp().day
-        strmonth = super().getTimeStamp().strftime('%B')  # To get the string representation of the month
-        year     = super().getTimeStamp().year
-        return f"Daily appointment starting {day} {strmonth} {year} '{super().getDescription()}'"
+        timestamp = self._timestamp
+        return f"Daily appointment starting {timestamp.day} {_MONTH_NAMES[timestamp.month]} {timestamp.year} '{self._description}'"
         
     def occursOn(self, day, month, year):
         """
@@ -278,11 +388,15 @@ class Monthly(Appointment):
 
     Methods
     -------
-    __repr__()
-        An override of the built-in function for returning a string representation of an object.
+    _render()
+        Compute the string representation of the appointment, cached by Appointment.__repr__.
     occursOn(day, month, year)
         Check if the monthly appointment occurs on the specified date.
+    toRecord()
+        Return the appointment as a dictionary including its day of the month.
     """
+    __slots__ = ("_day",)
+    _type = "Monthly"
 
     def __init__(self, description, day):
         """
@@ -297,10 +411,12 @@ class Monthly(Appointment):
         """
         super().__init__(description)
         self._day = day
-        self._type = "Monthly"
-        self._strspecified_time = f"{self._day} of every month"
+
+    @property
+    def _strspecified_time(self):
+        return f"{self._day} of every month"
     
-    def __repr__(self):
+    def _render(self):
         """
         Compute the "official" string representation of the Monthly appointment object.
 
@@ -309,20 +425,16 @@ class Monthly(Appointment):
         repr : str
             The string representation of the monthly appointment with the start date and description.
         """
-        cur_day   = super().getTimeStamp().day
-        cur_month = super().getTimeStamp().month
-        year      = super().getTimeStamp().year
+        timestamp = self._timestamp
+        month     = timestamp.month
+        year      = timestamp.year
 
         # If appointment day is less than the current day, the appointment will start next month
-        if self._day <= cur_day:
-            # Calculate the next month for the appointment to start
-            next_month = cur_month % 12 + 1
-            year      += cur_month // 12
-            strmonth   = dt.datetime(year, next_month, 1).strftime('%B')
-        else:
-            strmonth = super().getTimeStamp().strftime('%B')
-            
-        return f"Monthly appointment starting {self._day} {strmonth} {year} '{super().getDescription()}'"
+        if self._day <= timestamp.day:
+            year  += month // 12
+            month  = month % 12 + 1
+
+        return f"Monthly appointment starting {self._day} {_MONTH_NAMES[month]} {year} '{self._description}'"
     
     def occursOn(self, day, month, year):
         """
@@ -343,4 +455,796 @@ class Monthly(Appointment):
             True if the appointment occurs on the given day of any month, False otherwise.
         """
         return self._day == day
+
+    def toRecord(self):
+        """
+        Return the appointment as a dictionary including its day of the month.
+
+        """
+        record = super().toRecord()
+        record["day"] = self._day
+        return record
         
+
+
+def _file_mode(file_name):
+    """
+    Return the permission bits of a file, or the bits a new file gets with the current umask if it does not exist.
+
+    """
+    try:
+        return os.stat(file_name).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def save_many(appointments, file_name, file_format="text", append=False):
+    """
+    Save many appointments to a file with one buffered write.
+
+    Unlike calling Appointment.save for every appointment, the file is opened once. By default
+    the appointments are written to a temporary file in the same directory that then replaces
+    file_name, so readers never see a partially written file and a failed save leaves the old
+    file intact.
+
+    Parameters
+    ----------
+    appointments : iterable of Appointment
+        The appointments to save.
+    file_name : str
+        The name of the file.
+    file_format : str, optional
+        "text" for the lines written by Appointment.save (default), or "jsonl" for one JSON object per line.
+    append : bool, optional
+        If True, append to the file in place like Appointment.save instead of replacing it.
+
+    Returns
+    -------
+    count : int
+        The number of appointments saved.
+    """
+    if file_format == "text":
+        lines = [appointment.toLine() for appointment in appointments]
+    elif file_format == "jsonl":
+        lines = [json.dumps(appointment.toRecord()) + "\n" for appointment in appointments]
+    else:
+        raise ValueError(f"Unknown file format '{file_format}'. Use 'text' or 'jsonl'.")
+
+    if append:
+        with open(file_name, "a") as file:
+            file.write("".join(lines))
+        return len(lines)
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+    descriptor, temp_name = tempfile.mkstemp(dir=directory, prefix=".save_many-")
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            file.write("".join(lines))
+            file.flush()
+            # mkstemp creates the file readable by its owner only, so it gets the permissions
+            # of the file it replaces, or those a new file would get with the current umask
+            os.chmod(file.fileno(), _file_mode(file_name))
+            os.fsync(file.fileno())
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.remove(temp_name)
+        raise
+    return len(lines)
+
+
+def render_all(appointments):
+    """
+    Render many appointments as one string with one line per appointment.
+
+    The representations are cached by the appointments, so rendering the same appointments again
+    only joins the cached strings.
+
+    Parameters
+    ----------
+    appointments : iterable of Appointment
+        The appointments to render.
+
+    Returns
+    -------
+    text : str
+        The string representations joined by newlines, without a trailing newline.
+    """
+    return "\n".join(map(repr, appointments))
+
+
+# One line written by Appointment.save. The description is matched greedily up to the last quote
+# before the optional " at ..." part, so descriptions that contain quotes are read back whole.
+_LINE = re.compile(r"(?P<timestamp>[^|]*?) \| (?P<type>One time|Daily|Monthly) appointment: "
+                   r"'(?P<description>.*)'(?: at (?P<specified>[^']*))?$")
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_timestamp(text):
+    """
+    Parse an ISO format timestamp into POSIX seconds, cached because many appointments are created in the same second.
+
+    """
+    return int(dt.datetime.fromisoformat(text).timestamp())
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_date(text):
+    """
+    Parse the "year-month-day" date of a one-time appointment into a (day, month, year) tuple.
+
+    """
+    year, month, day = text.split("-")
+    return int(day), int(month), int(year)
+
+
+def _from_record(record):
+    """
+    Create an appointment from a dictionary written by save_many in the JSON lines format.
+
+    A record without a timestamp creates an appointment with the current time, as the constructors do.
+    """
+    if record["type"] == "One time":
+        appointment = OneTime(record["description"], record["day"], record["month"], record["year"])
+    elif record["type"] == "Daily":
+        appointment = Daily(record["description"])
+    elif record["type"] == "Monthly":
+        appointment = Monthly(record["description"], record["day"])
+    else:
+        raise ValueError(f"Unknown appointment type '{record['type']}'.")
+    if "timestamp" in record:
+        appointment._created = _parse_timestamp(record["timestamp"])
+    return appointment
+
+
+def _parse_line(line):
+    """
+    Create an appointment from a non-empty line written by Appointment.save or save_many, None if it is not one.
+
+    """
+    if line.startswith("{"):
+        return _from_record(json.loads(line))
+    match = _LINE.match(line)
+    if match is None:
+        return None
+    app_type, description, specified = match.group("type", "description", "specified")
+    if app_type == "One time":
+        appointment = OneTime(description, *_parse_date(specified))
+    elif app_type == "Daily":
+        appointment = Daily(description)
+    else:
+        appointment = Monthly(description, int(specified.split(" ", 1)[0]))
+    appointment._created = _parse_timestamp(match.group("timestamp"))
+    return appointment
+
+
+def load_appointments(file_name):
+    """
+    Read the appointments in a file one line at a time.
+
+    The file can be written by Appointment.save or by save_many in either format. Every line is
+    parsed with one regular expression (or one json.loads for the JSON lines format), and the
+    timestamps and dates are parsed with cached parsers, so a file is read in a single linear pass.
+    The appointments are created lazily, so a large file is never held in memory at once.
+
+    Parameters
+    ----------
+    file_name : str
+        The name of the file.
+
+    Yields
+    ------
+    appointment : Appointment
+        A OneTime, Daily or Monthly appointment with the timestamp stored in the file.
+
+    Raises
+    ------
+    ValueError
+        If a line is not a saved appointment.
+    """
+    with open(file_name, "r") as file:
+        for number, line in enumerate(file, 1):
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            appointment = _parse_line(line)
+            if appointment is None:
+                raise ValueError(f"Line {number} of {file_name} is not a saved appointment: {line!r}")
+            yield appointment
+
+
+class AppointmentFeed:
+    """
+    An incremental loader that reads only the lines appended to an appointment file since the last read.
+
+    The feed remembers the byte offset it has read up to and the inode of the file. When the file
+    is replaced, for example by save_many, or truncated, it is read again from the start, and the
+    appointments that were already read are skipped by their (timestamp, type, description,
+    specified time) key. sync also skips the appointments that are already in the book it adds
+    to, including those added to the book after the feed was created.
+    A line that is still being written, without its newline, is read once it is complete.
+
+    Attributes
+    ----------
+    _file_name : str
+        The name of the file.
+    _offset : int
+        The number of bytes of the file already read.
+    _inode : tuple or None
+        The (device, inode) of the file when it was last read.
+    _seen : set of tuple
+        The (timestamp, type, description, specified time) keys of the appointments already read.
+    _book : AppointmentBook or None
+        The book of the last sync.
+    _known : int
+        The number of appointments of _book whose keys are in _seen.
+
+    Methods
+    -------
+    poll()
+        Return the appointments appended since the last poll.
+    sync(book)
+        Add the appointments appended since the last poll to an AppointmentBook.
+    watch(interval)
+        Generate the appointments appended to the file as they are written.
+    """
+
+    def __init__(self, file_name, known=()):
+        """
+        Parameters
+        ----------
+        file_name : str
+            The name of the file, which does not have to exist yet.
+        known : iterable of Appointment, optional
+            Appointments that are already loaded, skipped when they are read from the file.
+        """
+        self._file_name = file_name
+        self._offset = 0
+        self._inode = None
+        self._seen = {self._key(appointment) for appointment in known}
+        self._book = None
+        self._known = 0
+
+    @staticmethod
+    def _key(appointment):
+        return appointment._created, appointment._type, appointment._description, appointment._strspecified_time
+
+    def poll(self):
+        """
+        Return the appointments appended to the file since the last poll.
+
+        The cost is proportional to the number of new bytes, not to the size of the file.
+
+        Returns
+        -------
+        appointments : list of Appointment
+            The new appointments in the order they are in the file, empty if the file does not exist.
+
+        Raises
+        ------
+        ValueError
+            If a new line is not a saved appointment. Nothing is consumed, so the next poll reads
+            the same lines again.
+        """
+        try:
+            stat = os.stat(self._file_name)
+        except FileNotFoundError:
+            return []
+        inode = (stat.st_dev, stat.st_ino)
+        if inode != self._inode or stat.st_size < self._offset:
+            self._inode, self._offset = inode, 0
+        if stat.st_size == self._offset:
+            return []
+
+        with open(self._file_name, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        # Only complete lines are read, an unfinished last line is read again by the next poll
+        end = data.rfind(b"\n") + 1
+
+        # All lines are parsed before the offset and the seen keys change, so a bad line loses nothing
+        appointments = []
+        keys = set()
+        for line in data[:end].decode().splitlines():
+            if not line:
+                continue
+            appointment = _parse_line(line)
+            if appointment is None:
+                raise ValueError(f"{self._file_name} has a line that is not a saved appointment: {line!r}")
+            key = self._key(appointment)
+            if key not in self._seen and key not in keys:
+                keys.add(key)
+                appointments.append(appointment)
+        self._offset += end
+        self._seen |= keys
+        return appointments
+
+    def sync(self, book):
+        """
+        Add the appointments appended to the file since the last poll to an AppointmentBook.
+
+        The appointments already in the book are skipped. Books only grow, so only the
+        appointments added to the book since the last sync are looked at.
+
+        Parameters
+        ----------
+        book : AppointmentBook
+            The book to add the appointments to.
+
+        Returns
+        -------
+        count : int
+            The number of appointments added.
+        """
+        if book is not self._book:
+            self._book, self._known = book, 0
+        self._seen.update(map(self._key, itertools.islice(book, self._known, None)))
+        appointments = self.poll()
+        for appointment in appointments:
+            book.add(appointment)
+        self._known = len(book)
+        return len(appointments)
+
+    def watch(self, interval=1.0):
+        """
+        Generate the appointments appended to the file, polling its size every interval.
+
+        The generator runs until it is closed. Polling with os.stat works on every platform and
+        file system, and an unchanged file costs one stat call per interval.
+
+        Parameters
+        ----------
+        interval : float, optional
+            The number of seconds between two polls.
+
+        Yields
+        ------
+        appointment : Appointment
+            Every new appointment, as soon as its line is complete.
+        """
+        while True:
+            yield from self.poll()
+            time.sleep(interval)
+
+
+class AppointmentBook:
+    """
+    A container of appointments with indexes that answer date queries without checking every appointment.
+
+    One-time appointments are indexed by their date, monthly appointments by their day of the month,
+    and daily appointments are kept in one list, so finding the appointments on a date only touches
+    the appointments that occur on it. Appointments of other Appointment subclasses are checked
+    with their occursOn method.
+
+    Attributes
+    ----------
+    _appointments : list of Appointment
+        All appointments, in the order they were added. The id of an appointment is its position.
+    _one_time : dict
+        Maps a date encoded as year * 10000 + month * 100 + day to the ids of the one-time appointments on that date.
+    _monthly : list of list of int
+        The ids of the monthly appointments for every day of the month, indexed by the day.
+    _daily : list of int
+        The ids of the daily appointments.
+    _other : list of int
+        The ids of appointments of other classes, and of monthly appointments on a day outside 1 to 31.
+
+    Methods
+    -------
+    add(appointment)
+        Add an appointment to the book.
+    occurringOn(day, month, year)
+        Return the appointments that occur on a date.
+    occurrencesBetween(start, end)
+        Return every (date, appointment) occurrence in a date range.
+    expand(start, end)
+        Return the occurrences in a date range as arrays of dates and appointment ids.
+    expandByMonth(start, end)
+        Generate the occurrences in a date range as arrays, one month at a time.
+    """
+
+    def __init__(self, appointments=()):
+        """
+        Parameters
+        ----------
+        appointments : iterable of Appointment, optional
+            Appointments to add to the book.
+        """
+        self._appointments = []
+        self._one_time = {}
+        self._monthly = [[] for _ in range(32)]
+        self._daily = []
+        self._other = []
+        for appointment in appointments:
+            self.add(appointment)
+
+    def __len__(self):
+        return len(self._appointments)
+
+    def __iter__(self):
+        return iter(self._appointments)
+
+    def add(self, appointment):
+        """
+        Add an appointment to the book and its index.
+
+        Parameters
+        ----------
+        appointment : Appointment
+            The appointment to add.
+
+        Returns
+        -------
+        id : int
+            The id of the appointment in the book.
+        """
+        # The index is chosen before anything is changed, so a failure leaves the book as it was
+        if isinstance(appointment, OneTime):
+            ids = self._one_time.get(appointment._date)
+            if ids is None:
+                ids = self._one_time[appointment._date] = []
+        elif isinstance(appointment, Monthly) and type(appointment._day) is int and 1 <= appointment._day <= 31:
+            ids = self._monthly[appointment._day]
+        elif isinstance(appointment, Daily):
+            ids = self._daily
+        else:
+            # Monthly appointments on a day that no month has are checked with occursOn, which never matches them
+            ids = self._other
+        appointment_id = len(self._appointments)
+        self._appointments.append(appointment)
+        ids.append(appointment_id)
+        return appointment_id
+
+    def _idsOn(self, day, month, year):
+        """
+        Return the ids of the appointments that occur on a date, in the order they were added.
+
+        The id lists of the indexes are already sorted, so they are merged instead of sorted.
+        """
+        other = [i for i in self._other if self._appointments[i].occursOn(day, month, year)]
+        return heapq.merge(self._one_time.get(year * 10000 + month * 100 + day, ()), self._monthlyIds(day), self._daily, other)
+
+    def _monthlyIds(self, day):
+        """
+        Return the ids of the indexed monthly appointments on a day of the month.
+
+        The day is checked before the index is used, so a day that no month has gives no ids
+        instead of wrapping around to the end of the index or raising an IndexError.
+        """
+        if type(day) is int and 1 <= day <= 31:
+            return self._monthly[day]
+        return []
+
+    def occurringOn(self, day, month, year):
+        """
+        Return the appointments that occur on the specified date.
+
+        Parameters
+        ----------
+        day : int
+            The day of the month.
+        month : int
+            The month of the year.
+        year : int
+            The year.
+
+        Returns
+        -------
+        appointments : list of Appointment
+            The appointments on the date, in the order they were added.
+        """
+        return [self._appointments[i] for i in self._idsOn(day, month, year)]
+
+    def occurrencesBetween(self, start, end):
+        """
+        Return every occurrence of an appointment between two dates.
+
+        Parameters
+        ----------
+        start : datetime.date
+            The first date of the range.
+        end : datetime.date
+            The last date of the range, included.
+
+        Returns
+        -------
+        occurrences : list of tuple
+            (date, appointment) tuples sorted by date, and by the order the appointments were added on the same date.
+        """
+        dates, ids = self.expand(start, end)
+        return [(dt.date.fromordinal(ordinal), self._appointments[i]) for ordinal, i in zip(dates, ids)]
+
+    def _expandMonth(self, year, month, first, last):
+        """
+        Return the dates and ids of the occurrences from day first to day last of a month.
+
+        Every day costs one concatenation and one sort of the already sorted id lists of the
+        indexes, so the work per occurrence is done by list and array operations, not by Python calls.
+        """
+        dates = array.array("l")
+        ids = array.array("l")
+        ordinal = dt.date(year, month, first).toordinal()
+        for day in range(first, last + 1):
+            day_ids = self._one_time.get(year * 10000 + month * 100 + day, []) + self._monthlyIds(day) + self._daily
+            if self._other:
+                day_ids += [i for i in self._other if self._appointments[i].occursOn(day, month, year)]
+                day_ids.sort()
+            elif len(day_ids) > len(self._daily):
+                day_ids.sort()
+            ids.extend(day_ids)
+            dates.extend(array.array("l", (ordinal,)) * len(day_ids))
+            ordinal += 1
+        return dates, ids
+
+    def expandByMonth(self, start, end):
+        """
+        Generate the occurrences between two dates one month at a time.
+
+        Only one month of occurrences is held in memory, so huge ranges can be streamed.
+
+        Parameters
+        ----------
+        start : datetime.date
+            The first date of the range.
+        end : datetime.date
+            The last date of the range, included.
+
+        Yields
+        ------
+        year : int
+            The year of the month.
+        month : int
+            The month.
+        dates : array.array
+            The proleptic Gregorian ordinals (datetime.date.toordinal) of the occurrences in the month.
+        ids : array.array
+            The ids of the appointments, aligned with dates. The occurrences are sorted by date,
+            and by the order the appointments were added on the same date.
+        """
+        year, month, first = start.year, start.month, start.day
+        while (year, month) <= (end.year, end.month):
+            last = calendar.monthrange(year, month)[1]
+            if (year, month) == (end.year, end.month):
+                last = end.day
+            if first <= last:
+                yield (year, month) + self._expandMonth(year, month, first, last)
+            year, month, first = year + month // 12, month % 12 + 1, 1
+
+    def expand(self, start, end):
+        """
+        Return every occurrence between two dates as arrays of dates and appointment ids.
+
+        Parameters
+        ----------
+        start : datetime.date
+            The first date of the range.
+        end : datetime.date
+            The last date of the range, included.
+
+        Returns
+        -------
+        dates : array.array
+            The proleptic Gregorian ordinals (datetime.date.toordinal) of the occurrences.
+        ids : array.array
+            The ids of the appointments, aligned with dates. The occurrences are sorted by date,
+            and by the order the appointments were added on the same date.
+        """
+        dates = array.array("l")
+        ids = array.array("l")
+        for _, _, month_dates, month_ids in self.expandByMonth(start, end):
+            dates.extend(month_dates)
+            ids.extend(month_ids)
+        return dates, ids
+
+
+# The appointments are stored in one table. The date columns of a one-time appointment are all set,
+# a monthly appointment only has its day and a daily appointment has none of them.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    created INTEGER NOT NULL,
+    year INTEGER,
+    month INTEGER,
+    day INTEGER
+);
+CREATE INDEX IF NOT EXISTS appointments_date ON appointments (year, month, day);
+CREATE INDEX IF NOT EXISTS appointments_type_day ON appointments (type, day);
+"""
+
+_COLUMNS = "id, type, description, created, year, month, day"
+
+# Each part of the union is answered from one index, which an OR of the conditions would not be
+_OCCURRING_ON = f"""
+SELECT {_COLUMNS} FROM appointments WHERE year = ? AND month = ? AND day = ?
+UNION ALL SELECT {_COLUMNS} FROM appointments WHERE type = 'Monthly' AND day = ?
+UNION ALL SELECT {_COLUMNS} FROM appointments WHERE type = 'Daily'
+ORDER BY id
+"""
+
+_RECURRING_OR_BETWEEN = f"""
+SELECT {_COLUMNS} FROM appointments WHERE (year, month, day) BETWEEN (?, ?, ?) AND (?, ?, ?)
+UNION ALL SELECT {_COLUMNS} FROM appointments WHERE type IN ('Monthly', 'Daily')
+ORDER BY id
+"""
+
+
+class AppointmentRepository:
+    """
+    Appointments stored in an SQLite database with indexes for date queries.
+
+    One-time appointments are indexed by (year, month, day) and monthly appointments by their day
+    of the month, so a date or a range is answered with prepared queries that read only the rows
+    that can occur in it, without loading the whole calendar.
+
+    Attributes
+    ----------
+    _connection : sqlite3.Connection
+        The connection to the database.
+
+    Methods
+    -------
+    add(appointment)
+        Store an appointment.
+    addMany(appointments)
+        Store many appointments in one transaction.
+    occurringOn(day, month, year)
+        Return the appointments that occur on a date.
+    occurrencesBetween(start, end)
+        Return every (date, appointment) occurrence in a date range.
+    close()
+        Close the database.
+    """
+
+    def __init__(self, file_name):
+        """
+        Parameters
+        ----------
+        file_name : str
+            The name of the database file, created if it does not exist, or ":memory:".
+        """
+        self._connection = sqlite3.connect(file_name)
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
+
+    def __iter__(self):
+        """
+        Iterate over all appointments in the order they were stored, reading them from the database lazily.
+
+        """
+        return map(self._fromRow, self._connection.execute(f"SELECT {_COLUMNS} FROM appointments ORDER BY id"))
+
+    @staticmethod
+    def _toRow(appointment):
+        """
+        Return the (type, description, created, year, month, day) row of an appointment.
+
+        Raises
+        ------
+        ValueError
+            If the appointment is not a OneTime, Daily or Monthly appointment.
+        """
+        if isinstance(appointment, OneTime):
+            return (appointment._type, appointment._description, appointment._created,
+                    appointment._year, appointment._month, appointment._day)
+        if isinstance(appointment, Monthly):
+            return (appointment._type, appointment._description, appointment._created, None, None, appointment._day)
+        if isinstance(appointment, Daily):
+            return (appointment._type, appointment._description, appointment._created, None, None, None)
+        raise ValueError(f"Cannot store an appointment of type {type(appointment).__name__}.")
+
+    @staticmethod
+    def _fromRow(row):
+        """
+        Create an appointment from a row of the appointments table.
+
+        """
+        _, app_type, description, created, year, month, day = row
+        if app_type == "One time":
+            appointment = OneTime(description, day, month, year)
+        elif app_type == "Monthly":
+            appointment = Monthly(description, day)
+        else:
+            appointment = Daily(description)
+        appointment._created = created
+        return appointment
+
+    def add(self, appointment):
+        """
+        Store an appointment in its own transaction.
+
+        Parameters
+        ----------
+        appointment : OneTime, Daily or Monthly
+            The appointment to store.
+
+        Returns
+        -------
+        id : int
+            The id of the appointment in the database.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO appointments (type, description, created, year, month, day) VALUES (?, ?, ?, ?, ?, ?)",
+                self._toRow(appointment))
+        return cursor.lastrowid
+
+    def addMany(self, appointments):
+        """
+        Store many appointments with one executemany in one transaction.
+
+        Parameters
+        ----------
+        appointments : iterable of OneTime, Daily or Monthly
+            The appointments to store.
+
+        Returns
+        -------
+        count : int
+            The number of appointments stored.
+        """
+        with self._connection:
+            cursor = self._connection.executemany(
+                "INSERT INTO appointments (type, description, created, year, month, day) VALUES (?, ?, ?, ?, ?, ?)",
+                map(self._toRow, appointments))
+        return cursor.rowcount
+
+    def occurringOn(self, day, month, year):
+        """
+        Return the appointments that occur on the specified date.
+
+        Parameters
+        ----------
+        day : int
+            The day of the month.
+        month : int
+            The month of the year.
+        year : int
+            The year.
+
+        Returns
+        -------
+        appointments : list of Appointment
+            The appointments on the date, in the order they were stored.
+        """
+        return [self._fromRow(row) for row in self._connection.execute(_OCCURRING_ON, (year, month, day, day))]
+
+    def occurrencesBetween(self, start, end):
+        """
+        Return every occurrence of an appointment between two dates.
+
+        Only the one-time appointments in the range and the recurring appointments are read, and
+        they are expanded with an AppointmentBook.
+
+        Parameters
+        ----------
+        start : datetime.date
+            The first date of the range.
+        end : datetime.date
+            The last date of the range, included.
+
+        Returns
+        -------
+        occurrences : list of tuple
+            (date, appointment) tuples sorted by date, and by the order the appointments were stored on the same date.
+        """
+        rows = self._connection.execute(_RECURRING_OR_BETWEEN,
+                                        (start.year, start.month, start.day, end.year, end.month, end.day))
+        return AppointmentBook(map(self._fromRow, rows)).occurrencesBetween(start, end)
+
+    def close(self):
+        """
+        Close the database.
+
+        """
+        self._connection.close()
@@ -0,0 +1,425 @@
+"""
+Benchmarks for the appointment classes.
+
+Run with e.g. "python Business_P10_24_benchmark.py --appointments 1000000" from this folder.
+"""
+import argparse, asyncio, datetime as dt, io, os, random, shutil, tempfile, time, tracemalloc
+from Business_P10_24 import AppointmentBook, AppointmentFeed, AppointmentRepository, OneTime, Daily, Monthly, load_appointments, render_all, save_many
+from Business_P10_24_service import AppointmentService, ServiceClient, serve_unix
+
+
+def random_appointments(count, seed=0):
+    """
+    Create a mix of one-time, daily and monthly appointments.
+
+    Parameters
+    ----------
+    count : int
+        The number of appointments.
+    seed : int, optional
+        The seed of the random number generator.
+
+    Returns
+    -------
+    appointments : list of Appointment
+        The appointments, of which 70% are one-time, 20% monthly and 10% daily.
+    """
+    rng = random.Random(seed)
+    appointments = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            appointments.append(OneTime(f"Meeting {i}", rng.randint(1, 28), rng.randint(1, 12), rng.randint(2020, 2030)))
+        elif kind < 0.9:
+            appointments.append(Monthly(f"Report {i}", rng.randint(1, 31)))
+        else:
+            appointments.append(Daily(f"Standup {i}"))
+    return appointments
+
+
+def bench_save(appointments, per_object_max):
+    """
+    Compare Appointment.save per appointment with save_many in both formats.
+
+    Parameters
+    ----------
+    appointments : list of Appointment
+        The appointments to save.
+    per_object_max : int
+        The largest number of appointments to save with one Appointment.save call each.
+    """
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join(directory, "appointments.txt")
+    print(f"{'method':>16} {'lines/s':>12}")
+
+    subset = appointments[:per_object_max]
+    start = time.perf_counter()
+    for appointment in subset:
+        appointment.save(file_name)
+    print(f"{'save per object':>16} {len(subset) / (time.perf_counter() - start):>12.0f}")
+    os.remove(file_name)
+
+    for file_format in ("text", "jsonl"):
+        start = time.perf_counter()
+        save_many(appointments, file_name, file_format)
+        print(f"{'save_many ' + file_format:>16} {len(appointments) / (time.perf_counter() - start):>12.0f}")
+        os.remove(file_name)
+    os.rmdir(directory)
+
+
+def legacy_load(file_name):
+    """
+    Load appointments with the per-character scanning parser the testfile used before load_appointments.
+
+    """
+    appointments = []
+    with open(file_name, "r") as file:
+        for line in file.readlines():
+            app_type = next((x for x in ["One", "Daily", "Monthly"] if x in line), False)
+            desc_indx = [i for i in range(len(line)) if line.startswith("'", i)]
+            desc = line[(desc_indx[0]+1):desc_indx[1]]
+            if app_type == "One":
+                app_date = dt.datetime.strptime(line[(line.find(" at ")+4):len(line)].strip(), "%Y-%m-%d")
+                new_app  = OneTime(desc, app_date.day, app_date.month, app_date.year)
+            elif app_type == "Daily":
+                new_app = Daily(desc)
+            elif app_type == "Monthly":
+                app_day = int(line[(line.find(" at ")+4):(line.find(" of ")+1)].strip())
+                new_app = Monthly(desc, app_day)
+            new_app.load(line)
+            appointments.append(new_app)
+    return appointments
+
+
+def bench_load(appointments, legacy_max):
+    """
+    Compare load_appointments with the legacy parser on a saved file.
+
+    Parameters
+    ----------
+    appointments : list of Appointment
+        The appointments to save and load.
+    legacy_max : int
+        The largest number of lines to load with the legacy parser.
+    """
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join(directory, "appointments.txt")
+    print(f"{'parser':>22} {'lines/s':>12}")
+
+    for file_format in ("text", "jsonl"):
+        save_many(appointments, file_name, file_format)
+        start = time.perf_counter()
+        count = sum(1 for _ in load_appointments(file_name))
+        print(f"{'load_appointments ' + file_format:>22} {count / (time.perf_counter() - start):>12.0f}")
+
+    save_many(appointments[:legacy_max], file_name)
+    start = time.perf_counter()
+    count = len(legacy_load(file_name))
+    print(f"{'legacy text':>22} {count / (time.perf_counter() - start):>12.0f}")
+    os.remove(file_name)
+    os.rmdir(directory)
+
+
+def bench_expand(appointments, days, scan_max):
+    """
+    Compare AppointmentBook.expand with calling occursOn for every appointment on every day of a range.
+
+    Parameters
+    ----------
+    appointments : list of Appointment
+        The appointments to expand.
+    days : int
+        The number of days in the range, starting on the first of January 2024.
+    scan_max : int
+        The largest number of appointments to check with occursOn.
+    """
+    start = dt.date(2024, 1, 1)
+    end = start + dt.timedelta(days=days - 1)
+    print(f"{'method':>16} {'occurrences':>12} {'seconds':>10}")
+
+    scanned = appointments[:scan_max]
+    begin = time.perf_counter()
+    count = 0
+    date = start
+    while date <= end:
+        count += sum(1 for appointment in scanned if appointment.occursOn(date.day, date.month, date.year))
+        date += dt.timedelta(days=1)
+    print(f"{'occursOn scan':>16} {count:>12} {time.perf_counter() - begin:>10.2f}")
+
+    book = AppointmentBook(appointments)
+    begin = time.perf_counter()
+    count = len(book.expand(start, end)[0])
+    print(f"{'expand':>16} {count:>12} {time.perf_counter() - begin:>10.2f}")
+
+    begin = time.perf_counter()
+    count = sum(len(dates) for _, _, dates, _ in book.expandByMonth(start, end))
+    print(f"{'expandByMonth':>16} {count:>12} {time.perf_counter() - begin:>10.2f}")
+
+
+def legacy_repr(appointment):
+    """
+    Render an appointment the way the __repr__ methods did before the rendering was cached.
+
+    """
+    timestamp = appointment.getTimeStamp
+    if isinstance(appointment, OneTime):
+        strmonth = dt.date(1900, appointment._month, 1).strftime('%B')
+        return f"One time appointment {appointment._day} {strmonth} {appointment._year} '{appointment.getDescription()}'"
+    if isinstance(appointment, Daily):
+        return (f"Daily appointment starting {timestamp().day} {timestamp().strftime('%B')} {timestamp().year} "
+                f"'{appointment.getDescription()}'")
+    cur_day, cur_month, year = timestamp().day, timestamp().month, timestamp().year
+    if appointment._day <= cur_day:
+        year += cur_month // 12
+        strmonth = dt.datetime(year, cur_month % 12 + 1, 1).strftime('%B')
+    else:
+        strmonth = timestamp().strftime('%B')
+    return f"Monthly appointment starting {appointment._day} {strmonth} {year} '{appointment.getDescription()}'"
+
+
+def bench_render(appointments):
+    """
+    Compare printing every appointment with the legacy rendering to render_all, before and after the cache is filled.
+
+    Parameters
+    ----------
+    appointments : list of Appointment
+        The appointments to render, which must not have been rendered yet.
+    """
+    print(f"{'method':>18} {'appointments/s':>15}")
+
+    output = io.StringIO()
+    start = time.perf_counter()
+    for appointment in appointments:
+        print(legacy_repr(appointment), file=output)
+    print(f"{'legacy print':>18} {len(appointments) / (time.perf_counter() - start):>15.0f}")
+    legacy = output.getvalue()
+
+    for name in ("render_all cold", "render_all cached"):
+        output = io.StringIO()
+        start = time.perf_counter()
+        print(render_all(appointments), file=output)
+        print(f"{name:>18} {len(appointments) / (time.perf_counter() - start):>15.0f}")
+        assert output.getvalue() == legacy
+
+
+def bench_feed(appointments, appends, batch):
+    """
+    Compare reloading a growing file with reading only the appended lines with an AppointmentFeed.
+
+    Parameters
+    ----------
+    appointments : list of Appointment
+        The appointments in the file before the appends.
+    appends : int
+        The number of times appointments are appended to the file.
+    batch : int
+        The number of appointments appended each time.
+    """
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join(directory, "appointments.txt")
+    save_many(appointments, file_name)
+    extra = random_appointments(appends * batch, seed=1)
+    feed = AppointmentFeed(file_name)
+    feed.poll()
+    reload_seconds = feed_seconds = 0.0
+    for i in range(appends):
+        save_many(extra[i * batch:(i + 1) * batch], file_name, append=True)
+        start = time.perf_counter()
+        sum(1 for _ in load_appointments(file_name))
+        reload_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        feed.poll()
+        feed_seconds += time.perf_counter() - start
+    shutil.rmtree(directory)
+    print(f"{'loader':>8} {'ms/append':>10}")
+    print(f"{'reload':>8} {reload_seconds / appends * 1e3:>10.2f}")
+    print(f"{'feed':>8} {feed_seconds / appends * 1e3:>10.2f}")
+
+
+def bench_repository(appointments, queries, flat_max):
+    """
+    Compare the SQLite repository with saving a flat file and scanning all of it for every date query.
+
+    Parameters
+    ----------
+    appointments : list of Appointment
+        The appointments to store.
+    queries : int
+        The number of date queries on the repository.
+    flat_max : int
+        The number of date queries on the flat file, which reparse the whole file each.
+    """
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join(directory, "appointments.txt")
+    rng = random.Random(0)
+    dates = [(rng.randint(1, 28), rng.randint(1, 12), rng.randint(2020, 2030)) for _ in range(queries)]
+    print(f"{'backend':>10} {'stored/s':>12} {'ms/query':>10} {'rows/query':>11}")
+
+    start = time.perf_counter()
+    save_many(appointments, file_name)
+    stored = len(appointments) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    rows = 0
+    for day, month, year in dates[:flat_max]:
+        rows += sum(1 for appointment in load_appointments(file_name) if appointment.occursOn(day, month, year))
+    print(f"{'flat file':>10} {stored:>12.0f} {(time.perf_counter() - start) / flat_max * 1e3:>10.2f} {rows / flat_max:>11.0f}")
+
+    with AppointmentRepository(os.path.join(directory, "appointments.db")) as repository:
+        start = time.perf_counter()
+        repository.addMany(appointments)
+        stored = len(appointments) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        rows = 0
+        for day, month, year in dates:
+            rows += len(repository.occurringOn(day, month, year))
+        print(f"{'sqlite':>10} {stored:>12.0f} {(time.perf_counter() - start) / queries * 1e3:>10.2f} {rows / queries:>11.0f}")
+    shutil.rmtree(directory)
+
+
+async def bench_service(clients, calendars, operations, query_ratio):
+    """
+    Load generator for the appointment service over a Unix socket.
+
+    Every client opens its own connection and sends a random mix of adds and queries to random
+    calendars, one request at a time. Reports the operations per second and the latency percentiles.
+
+    Parameters
+    ----------
+    clients : int
+        The number of concurrent clients.
+    calendars : int
+        The number of calendars.
+    operations : int
+        The number of requests sent by every client.
+    query_ratio : float
+        The fraction of the requests that are queries, the others are adds.
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "service.sock")
+    service = AppointmentService(os.path.join(directory, "calendars"))
+    server = await serve_unix(service, path)
+    latencies = {"add": [], "query": []}
+
+    async def client(seed):
+        rng = random.Random(seed)
+        connection = await ServiceClient.connect(path)
+        for _ in range(operations):
+            calendar = f"calendar{rng.randrange(calendars)}"
+            day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2024, 2025)
+            start = time.perf_counter()
+            if rng.random() < query_ratio:
+                await connection.query(calendar, day, month, year)
+                latencies["query"].append(time.perf_counter() - start)
+            else:
+                kind = rng.choice(("One time", "Daily", "Monthly"))
+                await connection.add(calendar, {"type": kind, "description": f"Meeting {rng.randrange(1000)}",
+                                                "day": day, "month": month, "year": year})
+                latencies["add"].append(time.perf_counter() - start)
+        await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(seed) for seed in range(clients)])
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    await service.close()
+    shutil.rmtree(directory)
+
+    print(f"{clients} clients, {calendars} calendars: {clients * operations / elapsed:.0f} ops/s")
+    print(f"{'op':>6} {'count':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for op, values in latencies.items():
+        if values:
+            values.sort()
+            print(f"{op:>6} {len(values):>8} {values[len(values) // 2] * 1e3:>8.2f} {values[int(len(values) * 0.99)] * 1e3:>8.2f}")
+
+
+class LegacyOneTime:
+    """
+    A one-time appointment with the attribute layout the appointment classes had before __slots__.
+
+    """
+
+    def __init__(self, description, day, month, year):
+        self._description = description
+        self._timestamp = dt.datetime.now().replace(microsecond=0)
+        self._type = "Generic"
+        self._strspecified_time = None
+        self._day = day
+        self._month = month
+        self._year = year
+        self._type = "One time"
+        self._strspecified_time = f"{self._year}-{self._month}-{self._day}"
+
+
+def bench_memory(count):
+    """
+    Report the bytes per one-time appointment with the legacy layout and with the current classes.
+
+    The descriptions repeat, like the entries of a recurring calendar, so the interning of the
+    current classes is part of the measurement.
+
+    Parameters
+    ----------
+    count : int
+        The number of appointments to create.
+    """
+    rng = random.Random(0)
+    fields = [(f"Meeting {rng.randrange(100)}", rng.randint(1, 28), rng.randint(1, 12), rng.randint(2020, 2030))
+              for _ in range(count)]
+    print(f"{'layout':>8} {'bytes/appointment':>18} {'created/s':>12}")
+    for name, cls in (("legacy", LegacyOneTime), ("slots", OneTime)):
+        # The descriptions are rebuilt for every layout, so each one allocates its own strings
+        tracemalloc.start()
+        start = time.perf_counter()
+        appointments = [cls("".join(description), day, month, year) for description, day, month, year in fields]
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del appointments
+        print(f"{name:>8} {size / count:>18.0f} {count / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='Business_P10_24_benchmark',
+                                     description="Benchmarks for the appointment classes.")
+    parser.add_argument("--appointments", type=int, default=1000000,
+                        help="The number of appointments to benchmark with.")
+    parser.add_argument("--legacy_max", type=int, default=100000,
+                        help="The largest number of lines to load with the legacy parser.")
+    parser.add_argument("--per_object_max", type=int, default=100000,
+                        help="The largest number of appointments to save with one Appointment.save call each.")
+    parser.add_argument("--days", type=int, default=365,
+                        help="The number of days to expand the appointments over.")
+    parser.add_argument("--scan_max", type=int, default=10000,
+                        help="The largest number of appointments to check with occursOn on every day.")
+    parser.add_argument("--queries", type=int, default=1000,
+                        help="The number of date queries on the SQLite repository.")
+    parser.add_argument("--flat_queries", type=int, default=3,
+                        help="The number of date queries that scan the flat file.")
+    parser.add_argument("--clients", type=int, default=64,
+                        help="The number of concurrent clients of the service load generator.")
+    parser.add_argument("--calendars", type=int, default=16,
+                        help="The number of calendars of the service load generator.")
+    parser.add_argument("--service_ops", type=int, default=1000,
+                        help="The number of requests sent by every client of the service load generator.")
+    parser.add_argument("--query_ratio", type=float, default=0.8,
+                        help="The fraction of the service requests that are queries.")
+    args = parser.parse_args()
+
+    appointments = random_appointments(args.appointments)
+    bench_save(appointments, args.per_object_max)
+    print()
+    bench_load(appointments, args.legacy_max)
+    print()
+    bench_render(appointments)
+    print()
+    bench_memory(args.appointments)
+    print()
+    bench_expand(appointments, args.days, args.scan_max)
+    print()
+    bench_feed(appointments, 10, 100)
+    print()
+    bench_repository(appointments, args.queries, args.flat_queries)
+    print()
+    asyncio.run(bench_service(args.clients, args.calendars, args.service_ops, args.query_ratio))
@@ -0,0 +1,499 @@
+"""
+An asyncio service that keeps many appointment calendars and serves them over a Unix socket.
+
+Every calendar is an AppointmentBook in memory, persisted to an append-only JSON lines log in the
+service directory. New appointments are committed to the log in batches: an add waits until the
+batch it belongs to is written, so a reply means the appointment is stored, but concurrent adds
+share one write and one fsync.
+
+Run the load generator with "python Business_P10_24_benchmark.py" from this folder.
+"""
+import asyncio
+import datetime as dt
+import json
+import os
+import re
+
+from Business_P10_24 import AppointmentBook, _from_record, load_appointments, save_many
+
+# Calendar names are used as file names, so they are restricted to characters that are safe in a path
+_NAME = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+def _appointment(record):
+    """
+    Create an appointment from a record sent by a client, checking every field first.
+
+    Raises
+    ------
+    ValueError
+        If the record is not a valid appointment.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("An appointment must be a JSON object.")
+    if not isinstance(record.get("description"), str):
+        raise ValueError("The description of an appointment must be a string.")
+    if "timestamp" in record and not isinstance(record["timestamp"], str):
+        raise ValueError("The timestamp of an appointment must be an ISO format string.")
+    app_type = record.get("type")
+    if app_type == "One time":
+        day, month, year = record.get("day"), record.get("month"), record.get("year")
+        if not all(type(field) is int for field in (day, month, year)):
+            raise ValueError("The day, month and year of a one time appointment must be integers.")
+        dt.date(year, month, day)  # Raises ValueError for a date that does not exist
+    elif app_type == "Monthly":
+        day = record.get("day")
+        if type(day) is not int or not 1 <= day <= 31:
+            raise ValueError("The day of a monthly appointment must be an integer from 1 to 31.")
+    elif app_type != "Daily":
+        raise ValueError(f"Unknown appointment type '{app_type}'.")
+    return _from_record(record)
+
+
+class _Calendar:
+    """
+    The state of one calendar of an AppointmentService.
+
+    Attributes
+    ----------
+    book : AppointmentBook
+        The appointments of the calendar.
+    log_name : str
+        The name of the append-only log of the calendar.
+    lock : asyncio.Lock
+        Serialises the file operations of the calendar: batch commits, save and load.
+    pending : list of Appointment
+        The appointments added since the last commit, not yet in the book.
+    committed : asyncio.Future or None
+        Resolved with the id of the first pending appointment when the pending appointments are
+        written and added to the book, None if nothing is pending.
+    ready : asyncio.Task
+        Reads the log when the calendar is first used.
+    """
+
+    def __init__(self, log_name):
+        self.book = AppointmentBook()
+        self.log_name = log_name
+        self.lock = asyncio.Lock()
+        self.pending = []
+        self.committed = None
+        self.ready = None
+
+
+class AppointmentService:
+    """
+    Many appointment calendars with per-calendar locks and batched commits to append-only logs.
+
+    Queries read the in-memory indexes without waiting for a lock. The file operations of a
+    calendar are serialised by its lock, so they never interleave, while different calendars
+    are committed, saved and loaded concurrently. Appointments are added to the indexes only
+    after they are written to the log, so a query never returns an appointment that is not stored.
+
+    Attributes
+    ----------
+    _directory : str
+        The directory with the logs of the calendars, one "<calendar>.jsonl" file each.
+    _files : str
+        The "files" subdirectory of _directory, the only place save and load read and write.
+    _batch_size : int
+        The number of pending appointments that triggers a commit.
+    _flush_interval : float
+        The longest time in seconds an appointment waits for its batch to be committed.
+    _fsync : bool
+        Whether a commit is flushed to disk with os.fsync.
+    _calendars : dict
+        Maps the name of a calendar to its _Calendar.
+    _flusher : asyncio.Task or None
+        The task that commits the pending appointments every flush interval.
+
+    Methods
+    -------
+    start()
+        Start committing pending appointments in the background.
+    close()
+        Commit the pending appointments and stop the background commits.
+    add(calendar, record)
+        Add an appointment to a calendar and wait until it is committed.
+    query(calendar, day, month, year)
+        Return the appointments of a calendar that occur on a date.
+    save(calendar, file_name)
+        Save the appointments of a calendar to a file in the files directory.
+    load(calendar, file_name)
+        Add the appointments in a file in the files directory to a calendar.
+    """
+
+    def __init__(self, directory, batch_size=512, flush_interval=0.01, fsync=True):
+        """
+        Parameters
+        ----------
+        directory : str
+            The directory with the logs of the calendars, created if it does not exist.
+        batch_size : int, optional
+            The number of pending appointments that triggers a commit.
+        flush_interval : float, optional
+            The longest time in seconds an appointment waits for its batch to be committed.
+        fsync : bool, optional
+            Whether a commit is flushed to disk with os.fsync.
+        """
+        self._directory = directory
+        self._files = os.path.join(directory, "files")
+        os.makedirs(self._files, exist_ok=True)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._fsync = fsync
+        self._calendars = {}
+        self._flusher = None
+
+    def start(self):
+        """
+        Start committing the pending appointments every flush interval, must be called from the event loop.
+
+        The first add starts the commits if start has not been called.
+        """
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flushEvery())
+
+    async def close(self):
+        """
+        Commit the pending appointments and stop the background commits.
+
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await asyncio.gather(*[self._commit(calendar) for calendar in self._calendars.values()])
+
+    async def _flushEvery(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            pending = [self._commit(calendar) for calendar in self._calendars.values() if calendar.pending]
+            if pending:
+                # Shielded, so cancelling the flusher in close never leaves a batch half committed
+                await asyncio.shield(asyncio.gather(*pending))
+
+    async def _calendar(self, name):
+        """
+        Return a calendar, reading its log the first time it is used.
+
+        Raises
+        ------
+        ValueError
+            If the name is not a valid calendar name.
+        """
+        calendar = self._calendars.get(name)
+        if calendar is None:
+            if not _NAME.fullmatch(name):
+                raise ValueError(f"Invalid calendar name '{name}'.")
+            calendar = self._calendars[name] = _Calendar(os.path.join(self._directory, name + ".jsonl"))
+            calendar.ready = asyncio.get_running_loop().create_task(self._read(calendar))
+        try:
+            await calendar.ready
+        except Exception:
+            # A calendar whose log could not be read is forgotten, so the next request reads it again
+            if self._calendars.get(name) is calendar:
+                del self._calendars[name]
+            raise
+        return calendar
+
+    def _path(self, file_name):
+        """
+        Return the path of a file that a client saves or loads, inside the files directory.
+
+        Raises
+        ------
+        ValueError
+            If the file name is not a string or resolves to a path outside the files directory.
+        """
+        if not isinstance(file_name, str):
+            raise ValueError("A file name must be a string.")
+        root = os.path.realpath(self._files)
+        path = os.path.realpath(os.path.join(root, file_name))
+        if path == root or os.path.commonpath([root, path]) != root:
+            raise ValueError(f"The file name '{file_name}' is outside the files directory of the service.")
+        return path
+
+    async def _read(self, calendar):
+        if os.path.exists(calendar.log_name):
+            appointments = await asyncio.to_thread(lambda: list(load_appointments(calendar.log_name)))
+            for appointment in appointments:
+                calendar.book.add(appointment)
+
+    def _write(self, log_name, appointments):
+        """
+        Append appointments to a log, run in a worker thread.
+
+        """
+        with open(log_name, "a") as file:
+            file.write("".join(json.dumps(appointment.toRecord()) + "\n" for appointment in appointments))
+            if self._fsync:
+                file.flush()
+                os.fsync(file.fileno())
+
+    async def _commit(self, calendar):
+        """
+        Write the pending appointments of a calendar to its log, add them to the book and resolve the future their adds wait on.
+
+        If the write fails, the appointments are not added and their adds raise the error. The
+        future is only resolved if it is not done, so a cancelled future never stops the commits.
+        """
+        async with calendar.lock:
+            pending, committed = calendar.pending, calendar.committed
+            if not pending:
+                return
+            calendar.pending, calendar.committed = [], None
+            try:
+                await asyncio.to_thread(self._write, calendar.log_name, pending)
+            except Exception as error:
+                if not committed.done():
+                    committed.set_exception(error)
+            else:
+                first_id = len(calendar.book)
+                for appointment in pending:
+                    calendar.book.add(appointment)
+                if not committed.done():
+                    committed.set_result(first_id)
+
+    async def add(self, calendar, record):
+        """
+        Add an appointment to a calendar and wait until it is committed to the log.
+
+        Parameters
+        ----------
+        calendar : str
+            The name of the calendar, created when it is first used.
+        record : dict
+            The appointment in the format of Appointment.toRecord. The timestamp is optional.
+
+        Returns
+        -------
+        id : int
+            The id of the appointment in the calendar.
+
+        Raises
+        ------
+        ValueError
+            If the record is not a valid appointment.
+        """
+        appointment = _appointment(record)
+        self.start()
+        calendar = await self._calendar(calendar)
+        position = len(calendar.pending)
+        calendar.pending.append(appointment)
+        if calendar.committed is None:
+            calendar.committed = asyncio.get_running_loop().create_future()
+        committed = calendar.committed
+        # Shielded, so a cancelled add neither cancels the commit nor the future the other adds wait on
+        if len(calendar.pending) >= self._batch_size:
+            await asyncio.shield(self._commit(calendar))
+        return await asyncio.shield(committed) + position
+
+    async def query(self, calendar, day, month, year):
+        """
+        Return the appointments of a calendar that occur on a date.
+
+        Parameters
+        ----------
+        calendar : str
+            The name of the calendar.
+        day : int
+            The day of the month.
+        month : int
+            The month of the year.
+        year : int
+            The year.
+
+        Returns
+        -------
+        appointments : list of str
+            The string representations of the appointments, in the order they were added.
+        """
+        calendar = await self._calendar(calendar)
+        return [repr(appointment) for appointment in calendar.book.occurringOn(day, month, year)]
+
+    async def save(self, calendar, file_name, file_format="text"):
+        """
+        Save the appointments of a calendar to a file with save_many, replacing the file.
+
+        The file is in the files subdirectory of the service directory, so clients cannot write
+        anywhere else.
+
+        Parameters
+        ----------
+        calendar : str
+            The name of the calendar.
+        file_name : str
+            The name of the file, relative to the files directory.
+        file_format : str, optional
+            "text" (default) or "jsonl", as for save_many.
+
+        Returns
+        -------
+        count : int
+            The number of appointments saved.
+        """
+        path = self._path(file_name)
+        calendar = await self._calendar(calendar)
+        async with calendar.lock:
+            return await asyncio.to_thread(save_many, list(calendar.book), path, file_format)
+
+    async def load(self, calendar, file_name):
+        """
+        Add the appointments in a file written by Appointment.save or save_many to a calendar.
+
+        The file is read from the files subdirectory of the service directory.
+
+        The appointments are written to the log of the calendar in one commit, and added to the
+        calendar only when the commit succeeded.
+
+        Parameters
+        ----------
+        calendar : str
+            The name of the calendar.
+        file_name : str
+            The name of the file, relative to the files directory.
+
+        Returns
+        -------
+        count : int
+            The number of appointments loaded.
+        """
+        path = self._path(file_name)
+        calendar = await self._calendar(calendar)
+        async with calendar.lock:
+            appointments = await asyncio.to_thread(lambda: list(load_appointments(path)))
+            await asyncio.to_thread(self._write, calendar.log_name, appointments)
+            for appointment in appointments:
+                calendar.book.add(appointment)
+        return len(appointments)
+
+
+async def serve_unix(service, path):
+    """
+    Serve an AppointmentService over a Unix socket.
+
+    Clients send one JSON object per line with an "op" and its arguments, and every request is
+    answered with one JSON object per line, {"result": ...} or {"error": ...}:
+
+        {"op": "add", "calendar": ..., "appointment": {...}}
+        {"op": "query", "calendar": ..., "day": ..., "month": ..., "year": ...}
+        {"op": "save", "calendar": ..., "file_name": ..., "file_format": ...}
+        {"op": "load", "calendar": ..., "file_name": ...}
+
+    The requests of one connection are answered in order, so clients that want concurrent
+    requests open several connections.
+
+    Parameters
+    ----------
+    service : AppointmentService
+        The service to serve. Its background commits are started.
+    path : str
+        The path of the Unix socket.
+
+    Returns
+    -------
+    server : asyncio.Server
+        The server.
+    """
+    operations = {
+        "add": lambda request: service.add(request["calendar"], request["appointment"]),
+        "query": lambda request: service.query(request["calendar"], request["day"], request["month"], request["year"]),
+        "save": lambda request: service.save(request["calendar"], request["file_name"], request.get("file_format", "text")),
+        "load": lambda request: service.load(request["calendar"], request["file_name"]),
+    }
+
+    async def handle(reader, writer):
+        try:
+            async for request in reader:
+                try:
+                    request = json.loads(request)
+                    reply = {"result": await operations[request["op"]](request)}
+                except Exception as error:
+                    # Every failure is answered, so one bad request never ends the connection
+                    reply = {"error": f"{type(error).__name__}: {error}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    service.start()
+    return await asyncio.start_unix_server(handle, path, limit=1 << 20)
+
+
+class ServiceClient:
+    """
+    A client of an AppointmentService served over a Unix socket.
+
+    Methods
+    -------
+    connect(path)
+        Connect to a service.
+    add(calendar, record)
+        Add an appointment to a calendar.
+    query(calendar, day, month, year)
+        Return the appointments of a calendar that occur on a date.
+    save(calendar, file_name, file_format)
+        Save the appointments of a calendar to a file in the files directory of the service.
+    load(calendar, file_name)
+        Add the appointments in a file in the files directory of the service to a calendar.
+    close()
+        Close the connection.
+    """
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+
+    @classmethod
+    async def connect(cls, path):
+        """
+        Connect to a service.
+
+        Parameters
+        ----------
+        path : str
+            The path of the Unix socket.
+
+        Returns
+        -------
+        client : ServiceClient
+            The connected client.
+        """
+        client = cls()
+        client._reader, client._writer = await asyncio.open_unix_connection(path, limit=1 << 20)
+        return client
+
+    async def _request(self, request):
+        """
+        Send a request and return its result.
+
+        Raises
+        ------
+        ValueError
+            If the service answered with an error.
+        """
+        self._writer.write(json.dumps(request).encode() + b"\n")
+        await self._writer.drain()
+        reply = json.loads(await self._reader.readline())
+        if "error" in reply:
+            raise ValueError(reply["error"])
+        return reply["result"]
+
+    async def add(self, calendar, record):
+        return await self._request({"op": "add", "calendar": calendar, "appointment": record})
+
+    async def query(self, calendar, day, month, year):
+        return await self._request({"op": "query", "calendar": calendar, "day": day, "month": month, "year": year})
+
+    async def save(self, calendar, file_name, file_format="text"):
+        return await self._request({"op": "save", "calendar": calendar, "file_name": file_name, "file_format": file_format})
+
+    async def load(self, calendar, file_name):
+        return await self._request({"op": "load", "calendar": calendar, "file_name": file_name})
+
+    async def close(self):
+        """
+        Close the connection.
+
+        """
+        self._writer.close()
+        await self._writer.wait_closed()
@@ -1,9 +1,12 @@
-from Business_P10_24 import OneTime, Daily, Monthly
+from Business_P10_24 import OneTime, Daily, Monthly, AppointmentBook, AppointmentFeed, save_many, render_all
 import datetime as dt
+import os
 
 
-# Create an empty list to store appointment objects
-appointment_list = []
+# Create an empty appointment book to store appointment objects, indexed by date
+appointment_list = AppointmentBook()
+# The feeds of the loaded files, so loading a file again only adds the appointments appended since
+feeds = {}
 
 # Start an infinite loop to continually prompt the user for input
 while True:
@@ -46,11 +49,11 @@ while True:
                     print(f"Error: {e}")
             
             new_app = OneTime(desc, day, month, year) # Instantiate a OneTime appointment object
-            appointment_list.append(new_app)          # Add the new appointment to the appointment list
+            appointment_list.add(new_app)          # Add the new appointment to the appointment list
         # Create a daily appointment if that option was selected
         elif app_type == 2:
             new_app = Daily(desc)            # Instantiate a Daily appointment object
-            appointment_list.append(new_app) # Add the new appointment to the appointment list
+            appointment_list.add(new_app) # Add the new appointment to the appointment list
         # Create a monthly appointment if that option was selected
         elif app_type == 3:
 
@@ -63,7 +66,7 @@ while True:
                     print("That's not a valid day. It must be between 1 and 31.")
 
             new_app = Monthly(desc, day)     # Instantiate a Monthly appointment object
-            appointment_list.append(new_app) # Add the new appointment to the appointment list
+            appointment_list.add(new_app) # Add the new appointment to the appointment list
         else:
             # Inform the user their input was invalid if it wasn't options 1, 2, or 3
             print("Not valid. Please specify 1, 2, or 3.")
@@ -87,12 +90,10 @@ while True:
         i = False
         print("---------------------------------------------------")
         print("Appointments on this date:")
-        # Iterate over the list of appointments
-        for a in appointment_list:
-            # Check if the appointment occurs on the given date
-            if a.occursOn(day, month, year):
-                print(a) # Print the appointment if it does
-                i = True # Set the flag to True since we found at least one appointment
+        # Look up the appointments on the given date in the index of the appointment book
+        for a in appointment_list.occurringOn(day, month, year):
+            print(a) # Print the appointment
+            i = True # Set the flag to True since we found at least one appointment
         # If no appointments were found, inform the user
         if not i: print("No appointments on this date.")
         print("---------------------------------------------------")
@@ -105,43 +106,22 @@ while True:
         else:
             # Prompt the user for a filename to save the appointments
             filename = input("Enter a filename (with file format): ")
-            # Iterate over the list of appointments and save each to the file
-            for a in appointment_list:
-                a.save(filename)
+            # Append all appointments to the file with one write
+            save_many(appointment_list, filename, append=True)
     
     # If the user selects option 4, they want to load appointments from a file
     elif choice == 4:
         # Prompt the user for a filename from which to load appointments
         filename = input("Enter a filename (with file format): ")
-        try:
-            # Open the specified file for reading
-            with open(filename, "r") as file:
-                # Read each line from the file
-                for line in file.readlines():
-                    # Determine the type of appointment from the line
-                    app_type = next((x for x in ["One", "Daily", "Monthly"] if x in line), False)
-                    # Extract the description from the line
-                    desc_indx = [i for i in range(len(line)) if line.startswith("'", i)]
-                    desc = line[(desc_indx[0]+1):desc_indx[1]]
-                    # Create a new appointment object based on the type
-                    if app_type == "One":
-                        # Parse the date for the OneTime appointment
-                        app_date = dt.datetime.strptime(line[(line.find(" at ")+4):len(line)].strip(), "%Y-%m-%d")
-                        new_app  = OneTime(desc, app_date.day, app_date.month, app_date.year)
-                    elif app_type == "Daily":
-                        new_app = Daily(desc)
-                    elif app_type == "Monthly":
-                        # Parse the day for the monthly appointment
-                        app_day = int(line[(line.find(" at ")+4):(line.find(" of ")+1)].strip())
-                        new_app = Monthly(desc, app_day)
-                    
-                    # Change datetime of the object to what is stored in file
-                    new_app.load(line) 
-                    # Add the new appointment to the list
-                    appointment_list.append(new_app)
-        except FileNotFoundError:
-            # Inform the user if the specified file could not be found
+        # Inform the user if the specified file could not be found
+        if not os.path.exists(filename):
             print("File not found.")
+        else:
+            # The appointments already in the book are skipped when the file is first read
+            if filename not in feeds:
+                feeds[filename] = AppointmentFeed(filename, appointment_list)
+            # Parse only the lines added since the file was last loaded
+            print(f"Loaded {feeds[filename].sync(appointment_list)} new appointments.")
     
     # If the user selects option 5, they want to print all the appointments
     elif choice == 5:
@@ -151,9 +131,8 @@ while True:
         else:
             print("---------------------------------------------------")
             print("Appointments added or loaded:")
-            # Iterate over the list of appointments and print each
-            for a in appointment_list:
-                print(a)
+            # Print all the appointments with one write, one line each
+            print(render_all(appointment_list))
             print("---------------------------------------------------")
 
     
@@ -1,8 +1,22 @@
+import array
+import bisect
+import contextlib
+import io
+import sys
+
+
 class Animal:
     """
     The base class for all animals, providing basic attributes and methods common to all animals.
 
-    ...
+    The attributes are declared in __slots__, so an animal has no per-instance dictionary, and
+    subclasses that add no attributes declare empty __slots__. Every subclass is registered by
+    its class name in Animal.registry when it is defined, so species can be added as plugins.
+
+    A subclass declared with ``templated=True``, like ``class Cat(Animal, templated=True)``, gets
+    describeTemplate and greetingText derived from its own describe() and greets(), which lets Herd
+    describe and greet it without a method call. It should only be declared so if its description
+    is its name and age formatted into a fixed text and its greeting is a fixed text.
 
     Attributes
     ----------
@@ -10,6 +24,14 @@ class Animal:
         The name of the animal, not intended to be accessed directly or modified by subclasses.
     _age : int or float
         The age of the animal, not intended to be accessed directly or modified by subclasses.
+    registry : dict
+        A class attribute mapping the name of every subclass to the subclass.
+    describeTemplate : str or None
+        A class attribute with the str.format template of describe(), with {0} for the name and
+        {1} for the age, or None. Herd uses it only for the class that defines it, so a subclass
+        that overrides describe() is described per object unless it is templated too.
+    greetingText : str or None
+        A class attribute with the text that greets() prints, or None. Herd uses it like describeTemplate.
 
     Methods
     -------
@@ -18,6 +40,55 @@ class Animal:
     describe()
         Provides a basic description of the animal including its name and age.
     """
+    __slots__ = ("_name", "_age")
+    registry = {}
+    describeTemplate = None
+    greetingText = None
+
+    def __init_subclass__(cls, templated=False, **kwargs):
+        """
+        Register a subclass by its class name, replacing a previous subclass with the same name.
+
+        Parameters
+        ----------
+        templated : bool, optional
+            Whether to derive describeTemplate and greetingText from describe() and greets().
+        """
+        super().__init_subclass__(**kwargs)
+        Animal.registry[cls.__name__] = cls
+        if templated:
+            cls.describeTemplate, cls.greetingText = cls._deriveTemplates()
+
+    @classmethod
+    def _deriveTemplates(cls):
+        """
+        Return the describeTemplate and greetingText of a class, derived from its describe() and greets().
+
+        Both methods are called on two probe animals with different names and ages. The description
+        of the first becomes a template by replacing its name and age, which is kept only if it also
+        gives the description of the second, and the greeting is kept only if both print the same
+        text. Anything else, including a method that raises, gives None, so Herd uses the method.
+        """
+        probes = [cls("\x00Name0\x00", 1234567), cls("\x00Name1\x00", 7654321.5)]
+        try:
+            description = probes[0].describe()
+            template = (description.replace("{", "{{").replace("}", "}}")
+                        .replace(probes[0]._name, "{0}").replace(str(probes[0]._age), "{1}"))
+            if any(template.format(probe._name, probe._age) != probe.describe() for probe in probes):
+                template = None
+        except Exception:
+            template = None
+        try:
+            greetings = []
+            for probe in probes:
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    probe.greets()
+                greetings.append(output.getvalue())
+            greeting = greetings[0] if greetings[0] == greetings[1] else None
+        except Exception:
+            greeting = None
+        return template, greeting
 
     def __init__(self, name, age):
         """
@@ -54,24 +125,12 @@ class Animal:
         return f"This is {self._name}, and it is {self._age} years old."
 
 
-class Cat(Animal):
+class Cat(Animal, templated=True):
     """
     A Cat class that inherits from Animal and represents a cat.
     """
+    __slots__ = ()
 
-    def __init__(self, name, age):
-        """
-        Construct a Cat instance using the Animal base class constructor.
-
-        Parameters
-        ----------
-        name : str
-            The name of the cat.
-        age : int or float
-            The age of the cat.
-        """
-        super().__init__(name, age)
-    
     def greets(self):
         """
         Prints the sound a cat makes.
@@ -90,24 +149,12 @@ class Cat(Animal):
         return super().describe() + "It is a cat."
 
 
-class Dog(Animal):
+class Dog(Animal, templated=True):
     """
     A Dog class that inherits from Animal and represents a dog.
     """
+    __slots__ = ()
 
-    def __init__(self, name, age):
-        """
-        Construct a Dog instance using the Animal base class constructor.
-
-        Parameters
-        ----------
-        name : str
-            The name of the dog.
-        age : int or float
-            The age of the dog.
-        """
-        super().__init__(name, age)
-    
     def greets(self):
         """
         Prints the sound a dog makes.
@@ -126,24 +173,12 @@ class Dog(Animal):
         return super().describe() + "It is a dog."
 
 
-class BigDog(Dog):
+class BigDog(Dog, templated=True):
     """
     A BigDog class that inherits from Dog and represents a big dog.
     """
+    __slots__ = ()
 
-    def __init__(self, name, age):
-        """
-        Construct a BigDog instance using the Dog class constructor.
-
-        Parameters
-        ----------
-        name : str
-            The name of the big dog.
-        age : int or float
-            The age of the big dog.
-        """
-        super().__init__(name, age)
-    
     def greets(self):
         """
         Prints the sound a big dog makes, extending the Dog class's method.
@@ -163,18 +198,315 @@ class BigDog(Dog):
         return super().describe()[:-2] + " and it is big."
 
 
+def declare_species(name, sound, kind=None, base=Animal):
+    """
+    Declare a species without writing a subclass.
+
+    The species describes itself like Cat and Dog do, and greets with the greeting of its base
+    class (if it has one) followed by its own sound, like BigDog. It is templated, so it gets the
+    describeTemplate and greetingText that Herd uses.
+
+    Parameters
+    ----------
+    name : str
+        The name of the class, under which it is registered in Animal.registry.
+    sound : str
+        The sound the species makes.
+    kind : str, optional
+        The kind in the description "It is a [kind].", the lower case name by default.
+    base : type, optional
+        The class the species inherits from, Animal by default.
+
+    Returns
+    -------
+    species : type
+        The new subclass.
+
+    Raises
+    ------
+    ValueError
+        If a species with the same name is already registered.
+    """
+    if name in Animal.registry:
+        raise ValueError(f"The species '{name}' is already registered.")
+    kind = name.lower() if kind is None else kind
+
+    def greets(self):
+        if base is not Animal:
+            base.greets(self)
+        print(sound)
+
+    def describe(self):
+        return Animal.describe(self) + f"It is a {kind}."
+
+    return type(name, (base,), {"__slots__": (), "__doc__": f"A {kind}, declared with declare_species.",
+                                "greets": greets, "describe": describe}, templated=True)
+
+
+class Herd:
+    """
+    A container of many animals stored in columns, which describes and greets them in bulk.
+
+    The names, ages and species of the animals are kept in three parallel columns instead of one
+    object per animal. A templated species, like Cat, Dog, BigDog and the species from
+    declare_species, is described and greeted by formatting its template without a method call. Every other species is described and greeted per object, so
+    the output is always that of the per-object methods.
+
+    Lookups by name and by age go through indexes that store the positions of the animals sorted
+    by name and by age, four bytes per animal each. They are built by the first lookup after
+    animals are added and reused until more animals are added.
+
+    Attributes
+    ----------
+    _names : list
+        The names of the animals.
+    _ages : list
+        The ages of the animals, int or float as given.
+    _kinds : array.array
+        The species code of every animal, an index into _species.
+    _species : list of type
+        The classes of the animals, in the order they were first added.
+    _codes : dict
+        Maps a class to its species code.
+    _describe : list of str or None
+        The description template of every species, None if it is described per object.
+    _greeting : list of str or None
+        The greeting printed by every species, None if it is greeted per object.
+    _by_name : array.array or None
+        The positions of the animals sorted by name, None until it is built.
+    _by_age : array.array or None
+        The positions of the animals sorted by age, None until it is built.
+
+    Methods
+    -------
+    add(animal)
+        Add an animal to the herd.
+    addMany(species, names, ages)
+        Add many animals of one species to the herd.
+    named(name)
+        Return the animals with a name.
+    agedBetween(low, high)
+        Return the animals with an age in a range.
+    describeAll()
+        Return the descriptions of all animals.
+    greetAll(file)
+        Write the greetings of all animals.
+    report(file, chunk_size)
+        Write the description and greetings of every animal.
+    """
+
+    def __init__(self, animals=()):
+        """
+        Parameters
+        ----------
+        animals : iterable of Animal, optional
+            The animals to add to the herd.
+        """
+        self._names = []
+        self._ages = []
+        self._kinds = array.array("H")
+        self._species = []
+        self._codes = {}
+        self._describe = []
+        self._greeting = []
+        self._by_name = None
+        self._by_age = None
+        for animal in animals:
+            self.add(animal)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, position):
+        """
+        Return the animal at a position as an object of its species, created on demand.
+
+        """
+        return self._species[self._kinds[position]](self._names[position], self._ages[position])
+
+    def _animals(self, positions):
+        """
+        Return the animals at many positions as objects of their species.
+
+        """
+        species, kinds, names, ages = self._species, self._kinds, self._names, self._ages
+        return [species[kinds[position]](names[position], ages[position]) for position in positions]
+
+    def _code(self, species):
+        """
+        Return the code of a species, looking up its templates the first time it is used.
+
+        Only the templates defined by the species itself are used, as inherited ones may not match
+        describe and greets of the species.
+        """
+        code = self._codes.get(species)
+        if code is None:
+            code = self._codes[species] = len(self._species)
+            self._species.append(species)
+            attributes = vars(species)
+            self._describe.append(attributes.get("describeTemplate"))
+            self._greeting.append(attributes.get("greetingText"))
+        return code
+
+    def add(self, animal):
+        """
+        Add an animal to the herd, storing its name, age and species.
+
+        Parameters
+        ----------
+        animal : Animal
+            The animal to add.
+        """
+        self._kinds.append(self._code(type(animal)))
+        self._names.append(animal._name)
+        self._ages.append(animal._age)
+        self._by_name = self._by_age = None
+
+    def addMany(self, species, names, ages):
+        """
+        Add many animals of one species to the herd without creating an object for each.
+
+        Parameters
+        ----------
+        species : type or str
+            The class of the animals, Animal or a subclass, or its name in Animal.registry.
+        names : sequence of str
+            The names of the animals.
+        ages : sequence of int or float
+            The ages of the animals, aligned with names.
+        """
+        if len(names) != len(ages):
+            raise ValueError("names and ages must have the same length.")
+        if isinstance(species, str):
+            species = Animal.registry[species]
+        self._kinds.extend(array.array("H", [self._code(species)]) * len(names))
+        self._names.extend(names)
+        self._ages.extend(ages)
+        self._by_name = self._by_age = None
+
+    def named(self, name):
+        """
+        Return the animals with a name, using the name index.
+
+        Parameters
+        ----------
+        name : str
+            The name to look up.
+
+        Returns
+        -------
+        animals : list of Animal
+            The animals with the name, in the order they were added.
+        """
+        if self._by_name is None:
+            self._by_name = array.array("I", sorted(range(len(self._names)), key=self._names.__getitem__))
+        key = self._names.__getitem__
+        start = bisect.bisect_left(self._by_name, name, key=key)
+        stop = bisect.bisect_right(self._by_name, name, lo=start, key=key)
+        return self._animals(self._by_name[start:stop])
+
+    def agedBetween(self, low, high):
+        """
+        Return the animals with an age from low to high, using the age index.
+
+        Parameters
+        ----------
+        low : int or float
+            The lowest age, included.
+        high : int or float
+            The highest age, included.
+
+        Returns
+        -------
+        animals : list of Animal
+            The animals in the age range, sorted by age, and by the order they were added for equal ages.
+        """
+        if self._by_age is None:
+            self._by_age = array.array("I", sorted(range(len(self._ages)), key=self._ages.__getitem__))
+        key = self._ages.__getitem__
+        start = bisect.bisect_left(self._by_age, low, key=key)
+        stop = bisect.bisect_right(self._by_age, high, lo=start, key=key)
+        return self._animals(self._by_age[start:stop])
+
+    def _texts(self, templates, fallback, start=0, stop=None):
+        """
+        Return the texts of the animals from start to stop, formatting the template of the species of each animal.
+
+        Animals of a species without a template are rendered with fallback(animal).
+        """
+        stop = len(self._names) if stop is None else stop
+        kinds = self._kinds[start:stop]
+        names = self._names[start:stop]
+        ages = self._ages[start:stop]
+        if None not in templates:
+            return list(map(str.format, map(templates.__getitem__, kinds), names, ages))
+        return [fallback(self._species[kind](name, age)) if templates[kind] is None else templates[kind].format(name, age)
+                for kind, name, age in zip(kinds, names, ages)]
+
+    def describeAll(self):
+        """
+        Return the descriptions of all animals, in the order they were added.
+
+        Returns
+        -------
+        descriptions : list of str
+            The description of every animal, equal to its describe().
+        """
+        return self._texts(self._describe, lambda animal: animal.describe())
+
+    def _greet(self, animal):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            animal.greets()
+        return output.getvalue()
+
+    def greetAll(self, file=None):
+        """
+        Write the greetings of all animals with one write, as calling greets for every animal would print them.
+
+        Parameters
+        ----------
+        file : file object, optional
+            The file to write to, sys.stdout by default.
+        """
+        greetings = [None if greeting is None else greeting.replace("{", "{{").replace("}", "}}")
+                     for greeting in self._greeting]
+        (sys.stdout if file is None else file).write("".join(self._texts(greetings, self._greet)))
+
+    def report(self, file=None, chunk_size=65536):
+        """
+        Write the description and the greetings of every animal, as printing describe() and calling greets() would.
+
+        The text is written in chunks of chunk_size animals, one write per chunk.
+
+        Parameters
+        ----------
+        file : file object, optional
+            The file to write to, sys.stdout by default.
+        chunk_size : int, optional
+            The number of animals written with one write.
+        """
+        file = sys.stdout if file is None else file
+        templates = [None if describe is None or greeting is None
+                     else describe + "\n" + greeting.replace("{", "{{").replace("}", "}}")
+                     for describe, greeting in zip(self._describe, self._greeting)]
+        for start in range(0, len(self._names), chunk_size):
+            file.write("".join(self._texts(templates, lambda animal: animal.describe() + "\n" + self._greet(animal),
+                                           start, start + chunk_size)))
+
 
-# Creating instances of Cat, Dog, and BigDog
-cat = Cat("Tom", 4)
-dog = Dog("Buddy", 6)
-big_dog = BigDog("Lucy", 10)
+if __name__ == "__main__":
+    # Creating instances of Cat, Dog, and BigDog
+    cat = Cat("Tom", 4)
+    dog = Dog("Buddy", 6)
+    big_dog = BigDog("Lucy", 10)
 
-# Output descriptions and greetings for each animal
-print(cat.describe())
-cat.greets()
+    # Output descriptions and greetings for each animal
+    print(cat.describe())
+    cat.greets()
 
-print(dog.describe())
-dog.greets()
+    print(dog.describe())
+    dog.greets()
 
-print(big_dog.describe())
-big_dog.greets()
+    print(big_dog.describe())
+    big_dog.greets()
@@ -0,0 +1,181 @@
+"""
+Benchmarks for the animal classes.
+
+Run with e.g. "python animal_hierarchy_benchmark.py --animals 1000000" from this folder.
+"""
+import argparse, contextlib, io, os, random, time, tracemalloc
+from animal_hierarchy import BigDog, Cat, Dog, Herd
+
+
+def random_animals(count, seed=0):
+    """
+    Create the columns of a random mix of cats, dogs and big dogs.
+
+    Parameters
+    ----------
+    count : int
+        The number of animals.
+    seed : int, optional
+        The seed of the random number generator.
+
+    Returns
+    -------
+    species, names, ages : list
+        The class, name and age of every animal.
+    """
+    rng = random.Random(seed)
+    species = [rng.choice((Cat, Dog, BigDog)) for _ in range(count)]
+    names = [f"Animal {i}" for i in range(count)]
+    ages = [rng.randint(1, 20) for _ in range(count)]
+    return species, names, ages
+
+
+def bench_report(count):
+    """
+    Compare printing describe() and calling greets() for every animal object with Herd.report.
+
+    Both write to os.devnull, and the output of both is compared in memory first.
+
+    Parameters
+    ----------
+    count : int
+        The number of animals.
+    """
+    species, names, ages = random_animals(count)
+    animals = [kind(name, age) for kind, name, age in zip(species, names, ages)]
+    herd = Herd(animals)
+
+    expected = io.StringIO()
+    with contextlib.redirect_stdout(expected):
+        for animal in animals[:10000]:
+            print(animal.describe())
+            animal.greets()
+    output = io.StringIO()
+    Herd(animals[:10000]).report(output)
+    assert output.getvalue() == expected.getvalue()
+
+    print(f"{'method':>16} {'animals/s':>12}")
+    with open(os.devnull, "w") as devnull:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            for animal in animals:
+                print(animal.describe())
+                animal.greets()
+        print(f"{'per object':>16} {count / (time.perf_counter() - start):>12.0f}")
+
+        start = time.perf_counter()
+        herd.report(devnull)
+        print(f"{'Herd.report':>16} {count / (time.perf_counter() - start):>12.0f}")
+
+        start = time.perf_counter()
+        columns = Herd()
+        for kind in (Cat, Dog, BigDog):
+            selected = [i for i, animal_kind in enumerate(species) if animal_kind is kind]
+            columns.addMany(kind, [names[i] for i in selected], [ages[i] for i in selected])
+        columns.report(devnull)
+        print(f"{'addMany + report':>16} {count / (time.perf_counter() - start):>12.0f}")
+
+    start = time.perf_counter()
+    [animal.describe() for animal in animals]
+    print(f"{'describe':>16} {count / (time.perf_counter() - start):>12.0f}")
+    start = time.perf_counter()
+    herd.describeAll()
+    print(f"{'describeAll':>16} {count / (time.perf_counter() - start):>12.0f}")
+
+
+class LegacyCat:
+    """
+    An animal with the attribute layout the animal classes had before __slots__.
+
+    """
+
+    def __init__(self, name, age):
+        self._name = name
+        self._age = age
+
+
+def bench_memory(count):
+    """
+    Report the bytes per animal with per-object dictionaries, with __slots__ and in a Herd with its indexes.
+
+    Every layout creates its own name strings, so the names are part of every measurement.
+
+    Parameters
+    ----------
+    count : int
+        The number of animals.
+    """
+    species, names, ages = random_animals(count)
+
+    def objects(kind):
+        return lambda: [kind("".join(name), age) for name, age in zip(names, ages)]
+
+    def herd():
+        herd = Herd()
+        herd.addMany(Cat, ["".join(name) for name in names], ages)
+        return herd
+
+    def indexed():
+        indexed = herd()
+        indexed.named(names[0])
+        indexed.agedBetween(1, 1)
+        return indexed
+
+    print(f"{'layout':>14} {'bytes/animal':>13}")
+    for name, build in (("__dict__", objects(LegacyCat)), ("__slots__", objects(Cat)),
+                        ("Herd", herd), ("Herd + indexes", indexed)):
+        tracemalloc.start()
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del result
+        print(f"{name:>14} {size / count:>13.0f}")
+
+
+def bench_lookup(count, lookups):
+    """
+    Compare looking up animals by name and age range by scanning a list of animals with the Herd indexes.
+
+    Parameters
+    ----------
+    count : int
+        The number of animals.
+    lookups : int
+        The number of lookups of every kind.
+    """
+    species, names, ages = random_animals(count)
+    animals = [kind(name, age) for kind, name, age in zip(species, names, ages)]
+    herd = Herd(animals)
+    rng = random.Random(1)
+    queries = [(names[rng.randrange(count)], rng.randint(1, 20)) for _ in range(lookups)]
+    print(f"{'method':>18} {'ms/lookup':>10} {'animals/lookup':>15}")
+
+    start = time.perf_counter()
+    herd.named(queries[0][0])
+    herd.agedBetween(1, 1)
+    print(f"{'build indexes':>18} {(time.perf_counter() - start) * 1e3:>10.3f}")
+
+    for name, scan, lookup in (
+            ("name", lambda name, age: [animal for animal in animals if animal._name == name],
+             lambda name, age: herd.named(name)),
+            ("age", lambda name, age: [animal for animal in animals if age <= animal._age <= age],
+             lambda name, age: herd.agedBetween(age, age))):
+        for method, find in (("scan", scan), ("index", lookup)):
+            start = time.perf_counter()
+            found = sum(len(find(*query)) for query in queries)
+            print(f"{method + ' by ' + name:>18} {(time.perf_counter() - start) / lookups * 1e3:>10.3f} {found / lookups:>15.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='animal_hierarchy_benchmark',
+                                     description="Benchmarks for the animal classes.")
+    parser.add_argument("--animals", type=int, default=1000000,
+                        help="The number of animals to benchmark with.")
+    parser.add_argument("--lookups", type=int, default=20,
+                        help="The number of lookups by name and by age range.")
+    args = parser.parse_args()
+
+    bench_report(args.animals)
+    print()
+    bench_memory(args.animals)
+    print()
+    bench_lookup(args.animals, args.lookups)